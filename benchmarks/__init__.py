@@ -0,0 +1 @@
+"""Performance benchmarks for the engine, the renderer and the pages."""
@@ -0,0 +1,62 @@
+"""Time the first run of one page in a fresh interpreter.
+
+Run by ``benchmarks.run`` in a subprocess per measurement::
+
+    python -m benchmarks.coldstart pages/simulation.py --config --warm-up
+
+prints one JSON object: the time to import Streamlit, the first page run
+(and the synchronous warm-up before it, with ``--warm-up``), and which heavy
+modules ended up loaded.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+HEAVY_MODULES = ["numpy", "scipy", "matplotlib", "pandas", "altair", "pyarrow"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure one cold page run.")
+    parser.add_argument("page", help="page script, relative to the repository root")
+    parser.add_argument("--config", action="store_true", help="run with a saved default config")
+    parser.add_argument("--warm-up", action="store_true", help="run the server warm-up first")
+    args = parser.parse_args(argv)
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # The warm-up thread the setup page starts would skew a cold measurement.
+    os.environ["EQUILIBRIUM_WARMUP"] = "0"
+
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    from equilibrium.reactions import default_config, reaction_options
+    import_s = time.perf_counter() - start
+
+    warm_up_s = 0.0
+    if args.warm_up:
+        from equilibrium.warmup import warm_up
+
+        start = time.perf_counter()
+        warm_up()
+        warm_up_s = time.perf_counter() - start
+
+    app = AppTest.from_file(os.path.join(repo, args.page), default_timeout=120)
+    if args.config:
+        app.session_state["config"] = default_config(next(iter(reaction_options)))
+    start = time.perf_counter()
+    app.run()
+    run_s = time.perf_counter() - start
+    if app.exception:
+        raise SystemExit(f"{args.page} raised: {app.exception[0].value}")
+    print(json.dumps({
+        "import_s": import_s,
+        "warm_up_s": warm_up_s,
+        "first_run_s": run_s,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Load-test the pages with a classroom of concurrent sessions.
+
+Each simulated student gets a random config (any preset, random boundary
+types and slider values on the setup page's grid). The student fills in the
+setup page, presses "Save Configuration", and then opens the Simulation and
+MCQ pages. Every page run is a real script run through ``AppTest``. Students
+arrive spread over ``--ramp`` seconds, which reproduces a class pressing
+Save within the same minute.
+
+``--mode processes`` (the default) spreads the sessions over worker
+processes, each running one session at a time. ``--mode threads`` runs every
+session in this process, sharing its caches the way one Streamlit server
+does. ``AppTest`` keeps its mock runtime and page registry in process-wide
+globals, though, so concurrent sessions there can see each other's widget
+state; its numbers show cache sharing, not what a deployment can take.
+
+A page that raises counts as a page error. An exception from ``AppTest``
+itself (other than a run timing out) is a harness error, as are, in
+threads mode, errors naming another session's widgets and lost Save clicks.
+Harness errors are reported separately and left out of the errors and
+latencies.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.load --students 60 --ramp 30
+    python -m benchmarks.load --students 200 --ramp 60 --workers 4
+
+The report gives throughput, p50/p95/p99 latency per page and RSS (this
+process plus all of its descendants) sampled over time. It is printed and
+written as JSON to ``benchmarks/results/load-<timestamp>.json``.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from equilibrium.reactions import SPECIES, random_config
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+SETUP_PAGE = os.path.join(REPO_DIR, "streamlit_app.py")
+PAGES = {"simulation": os.path.join(REPO_DIR, "pages", "simulation.py"),
+         "mcq": os.path.join(REPO_DIR, "pages", "MCQ.py")}
+MAX_LOAD_BOUNDARIES = 5
+PAGE_TIMEOUT = 300
+# Streamlit's generated widget keys, which only leak between sessions through the shared runtime.
+WIDGET_ID_PREFIX = "$$ID-"
+
+
+def _fill_setup_page(session_state, config):
+    # The same keys the setup page reads its widget defaults from.
+    session_state["reaction_choice"] = config["reaction_choice"]
+    session_state["n_boundaries"] = len(config["phase_changes"])
+    for i, change in enumerate(config["phase_changes"], start=1):
+        session_state[f"phase_change_{i}"] = change
+        session_state[f"temp_effect{i}"] = config["temp_effects"][i - 1]
+        session_state[f"vol_effect{i}"] = config["vol_effects"][i - 1]
+        for species in SPECIES:
+            session_state[f"{species}_perturb{i}"] = config[f"{species}_perturb_list"][i - 1]
+
+
+def _timed_run(app, page, timings, start_time, shared_runtime=False):
+    at = time.time() - start_time
+    start = time.perf_counter()
+    error = harness_error = None
+    try:
+        app.run()
+        if app.exception:
+            error = app.exception[0].value
+            if shared_runtime and WIDGET_ID_PREFIX in str(error):
+                # Another session's widget IDs: the threads-mode cross-talk.
+                error, harness_error = None, error
+    except RuntimeError as exc:
+        # A run over PAGE_TIMEOUT is a (very) slow page; anything else is the runner.
+        if "timed out" in str(exc):
+            error = repr(exc)
+        else:
+            harness_error = repr(exc)
+    except Exception as exc:
+        harness_error = repr(exc)
+    timings.append({"page": page, "at": at, "latency_s": time.perf_counter() - start,
+                    "error": error, "harness_error": harness_error})
+    return error is None and harness_error is None
+
+
+def student_session(index, seed, delay, start_time, shared_runtime=False):
+    """One student's visit, ``delay`` seconds after the wall-clock ``start_time``.
+
+    ``shared_runtime`` is set in ``--mode threads``. Returns a list of
+    per-page timings.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    time.sleep(max(0.0, start_time + delay - time.time()))
+    rng = random.Random(f"{seed}-{index}")
+    config = random_config(rng, rng.randint(1, MAX_LOAD_BOUNDARIES))
+    timings = []
+
+    setup = AppTest.from_file(SETUP_PAGE, default_timeout=PAGE_TIMEOUT)
+    _fill_setup_page(setup.session_state, config)
+    if not _timed_run(setup, "setup", timings, start_time, shared_runtime):
+        return timings
+    save = next((button for button in setup.button if button.label == "Save Configuration"), None)
+    if save is None:
+        timings.append({"page": "save", "at": time.time() - start_time, "latency_s": 0.0,
+                        "error": "setup page rendered without a Save Configuration button",
+                        "harness_error": None})
+        return timings
+    save.click()
+    if not _timed_run(setup, "save", timings, start_time, shared_runtime):
+        return timings
+    if "config" not in setup.session_state:
+        # With a shared runtime the click can land in another session.
+        timings[-1]["harness_error" if shared_runtime else "error"] = "Save Configuration did not store a config"
+        return timings
+    saved = setup.session_state["config"]
+
+    for page, path in PAGES.items():
+        app = AppTest.from_file(path, default_timeout=PAGE_TIMEOUT)
+        app.session_state["config"] = saved
+        _timed_run(app, page, timings, start_time, shared_runtime)
+    return timings
+
+
+def _share_mock_runtime():
+    """Let concurrent ``AppTest`` runs in one process coexist (``--mode threads``).
+
+    Each ``AppTest.run`` installs a mock ``Runtime`` singleton and clears it
+    when it finishes, which would pull the runtime out from under sessions
+    still running in other threads. Fall back to the last installed mock
+    instead of failing. Scripts are compiled one at a time: every run has its
+    own script cache, and concurrent compiles of the magic-rewritten AST can
+    fail inside CPython.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def serialised_get_bytecode(self, script_path):
+        with compile_lock:
+            return get_bytecode(self, script_path)
+
+    ScriptCache.get_bytecode = serialised_get_bytecode
+
+    last = []
+
+    def current(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        return last[0] if last else None
+
+    def instance(cls):
+        runtime = current(cls)
+        if runtime is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return runtime
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: current(cls) is not None)
+
+
+def _process_student(args):
+    return student_session(*args)
+
+
+def rss_mb(pid=None):
+    """Resident set size of ``pid`` (default: this process) from /proc, in MB."""
+    with open(f"/proc/{pid or 'self'}/status", encoding="ascii") as handle:
+        for line in handle:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat", encoding="ascii") as handle:
+                    # The command name may contain spaces; the ppid follows its ')'.
+                    if int(handle.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return children
+
+
+class RssSampler(threading.Thread):
+    """Samples the RSS of this process and its descendants every ``interval`` seconds."""
+
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        pid = os.getpid()
+        while not self._stopped.is_set():
+            total = rss_mb()
+            # The session processes' simulation workers are grandchildren.
+            pending = _children(pid)
+            while pending:
+                child = pending.pop()
+                try:
+                    total += rss_mb(child)
+                except OSError:
+                    pass
+                pending += _children(child)
+            self.samples.append({"at": time.perf_counter() - start, "rss_mb": total})
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def report(timings, wall_s, rss_samples):
+    pages = {}
+    for page in ["setup", "save", *PAGES]:
+        runs = [t for t in timings if t["page"] == page and t["harness_error"] is None]
+        latencies = [t["latency_s"] for t in runs if t["error"] is None]
+        pages[page] = {
+            "runs": len(latencies),
+            "errors": sum(1 for t in runs if t["error"] is not None),
+            "harness_errors": sum(1 for t in timings if t["page"] == page and t["harness_error"] is not None),
+            "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95),
+            "p99_s": percentile(latencies, 99),
+            "max_s": max(latencies, default=float("nan")),
+        }
+    ok = [t for t in timings if t["error"] is None and t["harness_error"] is None]
+    rss = [sample["rss_mb"] for sample in rss_samples]
+    return {
+        "wall_s": wall_s,
+        "page_runs": len(timings),
+        "errors": sum(1 for t in timings if t["error"] is not None and t["harness_error"] is None),
+        "harness_errors": sum(1 for t in timings if t["harness_error"] is not None),
+        "throughput_runs_per_s": len(ok) / wall_s if wall_s else float("nan"),
+        "pages": pages,
+        "rss_mb": {"start": rss[0] if rss else None, "peak": max(rss, default=None),
+                   "end": rss[-1] if rss else None,
+                   "median": statistics.median(rss) if rss else None},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the pages with concurrent sessions.")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds over which students arrive")
+    parser.add_argument("--mode", choices=["processes", "threads"], default="processes")
+    parser.add_argument("--workers", type=int, help="concurrent sessions (default: --students) "
+                                                    "or worker processes (default: CPU count)")
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--warm-up", action="store_true", help="run the server warm-up before the class arrives")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="RSS sampling period in seconds")
+    parser.add_argument("--out", help="report file (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    if not args.warm_up:
+        # The setup page would otherwise start the warm-up in the middle of the run.
+        os.environ["EQUILIBRIUM_WARMUP"] = "0"
+    else:
+        from equilibrium.warmup import warm_up
+
+        warm_up()
+    rng = random.Random(f"{args.seed}-arrivals")
+    delays = sorted(rng.uniform(0, args.ramp) for _ in range(args.students))
+
+    sampler = RssSampler(args.sample_interval)
+    sampler.start()
+    start = time.time()
+    timings = []
+    if args.mode == "threads":
+        _share_mock_runtime()
+        with ThreadPoolExecutor(max_workers=args.workers or args.students) as pool:
+            futures = [pool.submit(student_session, i, args.seed, delay, start, True)
+                       for i, delay in enumerate(delays)]
+            for future in futures:
+                timings.extend(future.result())
+    else:
+        # AppTest swaps out __main__ in the workers, so the task function must
+        # be pickled by its module path rather than as __main__._process_student.
+        from benchmarks.load import _process_student as process_student
+
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for student_timings in pool.map(process_student,
+                                            [(i, args.seed, delay, start) for i, delay in enumerate(delays)]):
+                timings.extend(student_timings)
+    wall_s = time.time() - start
+    sampler.stop()
+
+    summary = report(timings, wall_s, sampler.samples)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "options": vars(args),
+        "summary": summary,
+        "rss": sampler.samples,
+        "timings": timings,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("load-%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, default=str)
+
+    print(f"{args.students} students over {args.ramp:.0f} s ({args.mode}): {summary['page_runs']} page runs "
+          f"in {wall_s:.1f} s, {summary['throughput_runs_per_s']:.2f} runs/s, {summary['errors']} errors, "
+          f"{summary['harness_errors']} harness errors", file=sys.stderr)
+    for page, stats in summary["pages"].items():
+        print(f"  {page:10s} n={stats['runs']:4d}  p50 {stats['p50_s']:6.2f} s  p95 {stats['p95_s']:6.2f} s  "
+              f"p99 {stats['p99_s']:6.2f} s  max {stats['max_s']:6.2f} s", file=sys.stderr)
+    rss = summary["rss_mb"]
+    if rss["peak"] is not None:
+        print(f"  RSS start {rss['start']:.0f} MB, peak {rss['peak']:.0f} MB, end {rss['end']:.0f} MB", file=sys.stderr)
+    print(f"Wrote {out}.", file=sys.stderr)
+    return 1 if summary["errors"] or summary["harness_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
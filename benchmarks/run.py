@@ -0,0 +1,337 @@
+"""Benchmark the simulation engine, the renderer and the Streamlit pages.
+
+Every ``reaction_options`` preset is run with each boundary type at both
+ends of its slider range. For each case the suite records integration time,
+RHS/Jacobian evaluation counts, render time, image size, the share of the
+samples the figure draws and peak traced memory; it then reruns the whole
+pipeline repeatedly to measure memory growth, and runs each page script
+headlessly through ``AppTest``. Finally it times each page's first run in a
+fresh interpreter (``benchmarks.coldstart``), with and without the server
+warm-up, and counts the heavy modules a page loads when it has nothing to
+simulate.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.run                      # write results, check thresholds
+    python -m benchmarks.run --quick              # fewer repeats, for a smoke run
+    python -m benchmarks.run --write-thresholds   # re-baseline on this machine
+
+Results go to ``benchmarks/results/<timestamp>.json``. The summary metrics
+are compared with ``benchmarks/thresholds.json``, and the exit status is 1 if
+any of them is over its limit.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from equilibrium.engine import phase_cache, result_cache, run_simulation
+from equilibrium.quiz import quiz_visibility
+from equilibrium.reactions import (
+    CHANGE_TYPES, DEFAULT_BOUNDARIES, PERTURB_RANGE, SPECIES, TEMP_EFFECT_RANGE, VOL_EFFECT_RANGE,
+    reaction_options,
+)
+from equilibrium.render import all_visible, build_figure, plot_title, render_cache, render_to_bytes
+from equilibrium.sampling import ADAPTIVE_SAMPLES
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, "thresholds.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+PAGES = {"setup": "streamlit_app.py", "simulation": "pages/simulation.py", "mcq": "pages/MCQ.py"}
+# (name, page, run with a saved config, warm up first) for the cold-start runs.
+COLD_STARTS = [
+    ("setup", "streamlit_app.py", False, False),
+    ("simulation_no_config", "pages/simulation.py", False, False),
+    ("mcq_no_config", "pages/MCQ.py", False, False),
+    ("simulation", "pages/simulation.py", True, False),
+    ("mcq", "pages/MCQ.py", True, False),
+    ("simulation_warm", "pages/simulation.py", True, True),
+    ("mcq_warm", "pages/MCQ.py", True, True),
+]
+# --write-thresholds allows this much headroom over the measured value, and
+# at least this many seconds for timings, which are noisy at the ms scale.
+THRESHOLD_MARGIN = 2.0
+MIN_TIME_HEADROOM = 0.01
+# The share of a result's samples the rendered figure may draw.
+PLOTTED_FRACTION_LIMIT = 0.9
+
+SLIDER_RANGES = {
+    "Temperature": TEMP_EFFECT_RANGE,
+    "Volume/Pressure": VOL_EFFECT_RANGE,
+    "Addition": PERTURB_RANGE,
+}
+
+
+def extreme_config(reaction_choice, change_type, value, n_boundaries=DEFAULT_BOUNDARIES):
+    """A setup-page config whose boundaries all apply ``change_type`` at ``value``."""
+    reaction = reaction_options[reaction_choice]
+    config = {
+        "reaction_choice": reaction_choice,
+        "selected_reaction": reaction,
+        "phase_changes": [change_type] * n_boundaries,
+        "temp_effects": [value if change_type == "Temperature" else 0.0] * n_boundaries,
+        "vol_effects": [value if change_type == "Volume/Pressure" else 0.0] * n_boundaries,
+    }
+    for species, key in zip(SPECIES, "abcd"):
+        shown = change_type == "Addition" and reaction[key] != 0
+        config[f"{species}_perturb_list"] = [value if shown else 0.0] * n_boundaries
+    return config
+
+
+def iter_cases():
+    """Yield ``(name, config)`` for every preset x boundary type x slider extreme."""
+    for reaction_choice in reaction_options:
+        for change_type in CHANGE_TYPES:
+            for end, value in zip(("min", "max"), SLIDER_RANGES[change_type]):
+                yield f"{reaction_choice} | {change_type} | {end}", extreme_config(reaction_choice, change_type, value)
+
+
+def _stoich(config):
+    reaction = config["selected_reaction"]
+    return (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+
+
+def _clear_caches():
+    for cache in (result_cache, phase_cache, render_cache):
+        cache.clear()
+
+
+def _best_time(func, repeat):
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def _page_pipeline(config):
+    # What the Simulation and MCQ pages do with a config, uncached.
+    stoich = _stoich(config)
+    result = run_simulation(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+    title = plot_title(config["reaction_choice"], config["selected_reaction"]["delta_H"])
+    n_phases = len(result.sols)
+    image = render_to_bytes(build_figure(result, all_visible(n_phases, stoich), title))
+    quiz_image = render_to_bytes(build_figure(result, quiz_visibility(stoich, n_phases, 0), title))
+    return result, image, quiz_image
+
+
+def bench_case(config, repeat):
+    """Timings, evaluation counts, image size and peak memory for one config."""
+    def integrate():
+        phase_cache.clear()
+        return run_simulation(config)
+
+    engine_s, full = _best_time(integrate, repeat)
+
+    def integrate_adaptive():
+        phase_cache.clear()
+        return run_simulation(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+
+    adaptive_s, result = _best_time(integrate_adaptive, repeat)
+    stoich = _stoich(config)
+    title = plot_title(config["reaction_choice"], config["selected_reaction"]["delta_H"])
+    visibility = all_visible(len(result.sols), stoich)
+    render_s, image = _best_time(lambda: render_to_bytes(build_figure(result, visibility, title)), repeat)
+    # The pages' figures must be thinned to the displayed width, not draw every sample.
+    drawn = sum(len(segment) for collection in build_figure(result, visibility, title).axes[0].collections
+                for segment in collection.get_segments())
+    sampled = sum(len(t) for t in result.t_phases) * sum(order != 0 for order in stoich)
+
+    phase_cache.clear()
+    gc.collect()
+    tracemalloc.start()
+    _page_pipeline(config)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "engine_s": engine_s,
+        "engine_adaptive_s": adaptive_s,
+        "nfev": sum(stats.get("nfev", 0) for stats in full.stats),
+        "njev": sum(stats.get("njev", 0) for stats in full.stats),
+        "render_s": render_s,
+        "image_bytes": len(image),
+        "plotted_fraction": drawn / sampled,
+        "peak_mb": peak / 2**20,
+    }
+
+
+def bench_growth(configs, reruns):
+    """Traced memory left behind by repeated uncached reruns of every config.
+
+    The caches are emptied before every rerun, so anything that still grows
+    after the first one (figures, pyplot state, solver buffers) is a leak.
+    """
+    tracemalloc.start()
+    samples = []
+    for _ in range(reruns):
+        _clear_caches()
+        for config in configs:
+            _page_pipeline(config)
+        _clear_caches()
+        gc.collect()
+        samples.append(tracemalloc.get_traced_memory()[0] / 2**20)
+    tracemalloc.stop()
+    return {"traced_mb": samples, "growth_mb": samples[-1] - samples[0]}
+
+
+def bench_pages(config, repeat):
+    """Wall time of each page script run headlessly, first run and reruns."""
+    from streamlit.testing.v1 import AppTest
+
+    timings = {}
+    for name, path in PAGES.items():
+        _clear_caches()
+        app = AppTest.from_file(os.path.join(REPO_DIR, path), default_timeout=120)
+        if name != "setup":
+            app.session_state["config"] = config
+        runs = []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            app.run()
+            runs.append(time.perf_counter() - start)
+            if app.exception:
+                raise RuntimeError(f"{path} raised: {app.exception[0].value}")
+        timings[name] = {"first_s": runs[0], "rerun_s": statistics.median(runs[1:])}
+    return timings
+
+
+def bench_cold_start():
+    """First-run timings of each page in a fresh interpreter."""
+    timings = {}
+    for name, page, with_config, warm in COLD_STARTS:
+        command = [sys.executable, "-m", "benchmarks.coldstart", page]
+        command += ["--config"] * with_config + ["--warm-up"] * warm
+        output = subprocess.run(command, cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+        timings[name] = json.loads(output.strip().splitlines()[-1])
+    return timings
+
+
+def summarize(cases, growth, pages, cold):
+    summary = {}
+    for metric in ("engine_s", "engine_adaptive_s", "nfev", "render_s", "image_bytes", "plotted_fraction",
+                   "peak_mb"):
+        values = [case[metric] for case in cases.values()]
+        summary[f"{metric}.max"] = max(values)
+        summary[f"{metric}.median"] = statistics.median(values)
+    summary["growth_mb"] = growth["growth_mb"]
+    for name, timing in pages.items():
+        summary[f"page.{name}.first_s"] = timing["first_s"]
+        summary[f"page.{name}.rerun_s"] = timing["rerun_s"]
+    for name, timing in cold.items():
+        summary[f"cold.{name}.first_s"] = timing["first_run_s"]
+        summary[f"cold.{name}.heavy_modules"] = len(timing["heavy_modules"])
+        if timing["warm_up_s"]:
+            summary["cold.warm_up_s"] = timing["warm_up_s"]
+    return summary
+
+
+def check(summary, thresholds):
+    """Names, values and limits of the summary metrics over their thresholds."""
+    return [
+        {"metric": metric, "value": summary[metric], "limit": limit}
+        for metric, limit in sorted(thresholds.items())
+        if metric in summary and summary[metric] > limit
+    ]
+
+
+def environment():
+    import matplotlib
+    import numpy
+    import scipy
+    import streamlit
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "matplotlib": matplotlib.__version__,
+        "streamlit": streamlit.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks.")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repeats per measurement (best is kept)")
+    parser.add_argument("--reruns", type=int, default=5, help="pipeline reruns for the memory growth check")
+    parser.add_argument("--quick", action="store_true", help="one repeat, two reruns")
+    parser.add_argument("--no-pages", action="store_true", help="skip the AppTest page and cold-start runs")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    parser.add_argument("--write-thresholds", action="store_true",
+                        help=f"set every threshold to {THRESHOLD_MARGIN}x the measured value")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.repeat, args.reruns = 1, 2
+    # A warm-up thread started by the setup page would skew every timing.
+    os.environ["EQUILIBRIUM_WARMUP"] = "0"
+
+    cases = {}
+    for name, config in iter_cases():
+        cases[name] = bench_case(config, args.repeat)
+        print(f"{name:60s} engine {cases[name]['engine_s'] * 1e3:7.1f} ms  "
+              f"render {cases[name]['render_s'] * 1e3:7.1f} ms", file=sys.stderr)
+    configs = [config for _, config in iter_cases()]
+    # Every sixth case covers each preset once, cycling through the boundary types.
+    growth = bench_growth(configs[::6], args.reruns)
+    pages = {} if args.no_pages else bench_pages(configs[0], args.repeat)
+    cold = {} if args.no_pages else bench_cold_start()
+    summary = summarize(cases, growth, pages, cold)
+
+    thresholds = {}
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds, encoding="utf-8") as handle:
+            thresholds = json.load(handle)
+    if args.write_thresholds:
+        thresholds = {}
+        for metric, value in summary.items():
+            limit = value * THRESHOLD_MARGIN
+            if metric.endswith("_s") or "_s." in metric:
+                limit = max(limit, value + MIN_TIME_HEADROOM)
+            thresholds[metric] = round(limit, 6)
+        # Memory growth should stay near zero; give it a fixed allowance instead.
+        thresholds["growth_mb"] = 1.0
+        # Drawing (nearly) every sample means the downsampling has stopped running.
+        thresholds["plotted_fraction.max"] = PLOTTED_FRACTION_LIMIT
+        with open(args.thresholds, "w", encoding="utf-8") as handle:
+            json.dump(thresholds, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+    failures = check(summary, thresholds)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "options": {"repeat": args.repeat, "reruns": args.reruns},
+        "summary": summary,
+        "failures": failures,
+        "cases": cases,
+        "growth": growth,
+        "pages": pages,
+        "cold_start": cold,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=False)
+
+    for metric, value in summary.items():
+        print(f"{metric:40s} {value:12.4f}", file=sys.stderr)
+    for failure in failures:
+        print(f"REGRESSION {failure['metric']}: {failure['value']:.4f} > {failure['limit']:.4f}", file=sys.stderr)
+    print(f"Wrote {out}.", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""Shared simulation code for the Equilibrium Graph Generator pages.
+
+Kept import-light on purpose: the Streamlit pages import submodules from here
+directly so that nothing heavy is pulled in until it is needed.
+"""
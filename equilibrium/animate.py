@@ -0,0 +1,325 @@
+"""Animate a result: the graph builds up phase by phase and flashes at each boundary.
+
+Redrawing the whole figure for every frame would cost a full render per
+frame. Instead the axes, labels, legend and title are drawn once, and each
+frame draws only the line pieces that are new since the previous frame on top
+of it (blitting onto an accumulating canvas). The boundary flash is drawn over
+a saved copy of the canvas and wiped by restoring that copy on the next frame.
+
+Frames are encoded as they are drawn, so a clip never exists as a stack of
+raw frames:
+
+``gif``   Pillow, one frame at a time, each cropped to the pixels that changed
+``mp4``   H.264 through an ``ffmpeg`` pipe (fragmented, so it streams)
+``webm``  VP9 through an ``ffmpeg`` pipe
+
+MP4 and WebM need ``ffmpeg`` on the PATH. Encoded clips are cached with the
+rendered images, keyed by the result's config key and the clip options.
+
+From the command line::
+
+    python -m equilibrium.animate --configs saved.json --format gif --out class.gif
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+from equilibrium.metrics import observe, timed
+from equilibrium.reactions import PHASE_DURATION, SPECIES, SPECIES_COLORS
+from equilibrium.render import LINEWIDTH, render_cache
+
+ANIMATION_FORMATS = {
+    "gif": {"mime": "image/gif", "codec": None},
+    "mp4": {"mime": "video/mp4",
+            "codec": ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+                      "-movflags", "frag_keyframe+empty_moov", "-f", "mp4"]},
+    "webm": {"mime": "video/webm",
+             "codec": ["-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8", "-b:v", "1M",
+                       "-pix_fmt", "yuv420p", "-f", "webm"]},
+}
+# 800 x 480 pixels: both even, as yuv420p needs.
+ANIMATION_FIGSIZE = (8, 4.8)
+ANIMATION_DPI = 100
+DEFAULT_SECONDS = 20
+DEFAULT_FPS = 20
+# How long a GIF holds its last frame before looping.
+HOLD_SECONDS = 2
+FLASH_SECONDS = 0.5
+FLASH_COLOR = "orange"
+CHUNK_SIZE = 64 * 1024
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def available_formats():
+    """The formats this machine can encode."""
+    return [fmt for fmt, spec in ANIMATION_FORMATS.items() if spec["codec"] is None or ffmpeg_available()]
+
+
+def boundary_label(config, i):
+    """A short description of boundary ``i``'s change, e.g. ``Temperature +0.25``."""
+    change = config["phase_changes"][i]
+    if change == "Temperature":
+        return f"Temperature {config['temp_effects'][i]:+.2f}"
+    if change == "Volume/Pressure":
+        return f"Volume/Pressure {config['vol_effects'][i]:+.2f}"
+    added = [f"{species} {config[f'{species}_perturb_list'][i]:+.2f}" for species in SPECIES
+             if config[f"{species}_perturb_list"][i]]
+    return f"{change} " + (", ".join(added) or "none")
+
+
+def iter_frames(result, config, title=None, seconds=DEFAULT_SECONDS, fps=DEFAULT_FPS):
+    """Yield the animation as (height, width, 4) uint8 RGBA frames.
+
+    Every frame is the canvas buffer itself, valid until the next one is
+    requested.
+    """
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.lines import Line2D
+
+    reaction = config["selected_reaction"]
+    present = [(column, species) for column, species in enumerate(SPECIES) if reaction["abcd"[column]] != 0]
+    # One polyline per species through every phase. Consecutive phases share
+    # their boundary time, so the jump at a boundary is drawn as a vertical piece.
+    t = np.concatenate(result.t_phases)
+    polylines = {species: np.column_stack([t, np.concatenate([sol[:, column] for sol in result.sols])])
+                 for column, species in present}
+    t_start, t_end = t[0], t[-1]
+    y_max = max(float(line[:, 1].max()) for line in polylines.values()) or 1.0
+
+    fig = Figure(figsize=ANIMATION_FIGSIZE, dpi=ANIMATION_DPI)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_xlim(t_start, t_end)
+    ax.set_ylim(-0.02 * y_max, 1.15 * y_max)
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Concentration")
+    if title:
+        ax.set_title(title)
+    ax.legend(handles=[Line2D([], [], color=SPECIES_COLORS[species], linewidth=LINEWIDTH, label=species)
+                       for species in polylines], loc="upper right")
+    fig.tight_layout()
+    lines = {species: ax.add_line(Line2D([], [], color=SPECIES_COLORS[species], linewidth=LINEWIDTH,
+                                         animated=True))
+             for species in polylines}
+    flash = ax.axvline(t_start, color=FLASH_COLOR, linewidth=6, animated=True)
+    label = ax.text(t_start, 1.08 * y_max, "", ha="center", va="center", animated=True,
+                    bbox={"boxstyle": "round", "facecolor": FLASH_COLOR, "edgecolor": "none"})
+    # Animated artists are left out of a full draw, so this is the background.
+    canvas.draw()
+
+    n_frames = max(2, round(seconds * fps))
+    flash_frames = max(1, round(FLASH_SECONDS * fps))
+    boundaries = [PHASE_DURATION * (i + 1) for i in range(len(config["phase_changes"]))]
+    drawn = dict.fromkeys(polylines, 0)
+    passed = 0
+    flash_start = flash_boundary = None
+    clean = None
+    frame = np.asarray(canvas.buffer_rgba())
+    for k in range(n_frames):
+        if clean is not None:
+            canvas.restore_region(clean)
+            clean = None
+        t_now = t_start + (t_end - t_start) * k / (n_frames - 1)
+        for species, points in polylines.items():
+            end = int(np.searchsorted(points[:, 0], t_now, side="right"))
+            if end > drawn[species]:
+                # Start from the last point already drawn, so the pieces join.
+                lines[species].set_data(points[max(drawn[species] - 1, 0):end].T)
+                ax.draw_artist(lines[species])
+                drawn[species] = end
+        while passed < len(boundaries) and t_now >= boundaries[passed]:
+            flash_start, flash_boundary = k, passed
+            passed += 1
+        if flash_start is not None and k - flash_start < flash_frames:
+            clean = canvas.copy_from_bbox(fig.bbox)
+            x = boundaries[flash_boundary]
+            flash.set_xdata([x, x])
+            flash.set_alpha(0.7 * (1 - (k - flash_start) / flash_frames))
+            ax.draw_artist(flash)
+            label.set_x(min(max(x, t_start + 0.1 * (t_end - t_start)), t_end - 0.1 * (t_end - t_start)))
+            label.set_text(f"Boundary {flash_boundary + 1}: {boundary_label(config, flash_boundary)}")
+            ax.draw_artist(label)
+        yield frame
+
+
+def gif_palette():
+    """The GIF colour table as a (256, 3) array.
+
+    The plot only uses the species colours, the flash colour and black on
+    white, so every colour is one of those blended with white. A fixed palette
+    keeps every frame on the same colour table, with no extra render to
+    sample colours from.
+    """
+    import numpy as np
+    from matplotlib.colors import to_rgb
+
+    bases = np.array([to_rgb(color) for color in [*SPECIES_COLORS.values(), FLASH_COLOR, "black"]])
+    mix = np.linspace(0, 1, 256 // len(bases))
+    palette = np.rint(255 * (1 - mix[None, :, None] * (1 - bases[:, None, :]))).reshape(-1, 3)
+    return np.vstack([palette, np.full((256 - len(palette), 3), 255)]).astype(np.uint8)
+
+
+def _palette_image(rgba, palette):
+    # Exact nearest-colour mapping. Pillow's own lookup is approximate and
+    # tints the white background; a region only has a few hundred distinct
+    # colours, so matching those is cheap.
+    import numpy as np
+    from PIL import Image
+
+    colors, inverse = np.unique(np.ascontiguousarray(rgba).view(np.uint32).ravel(), return_inverse=True)
+    rgb = colors.view(np.uint8).reshape(-1, 4)[:, :3].astype(np.int32)
+    nearest = ((rgb[:, None, :] - palette[None, :, :].astype(np.int32)) ** 2).sum(axis=2).argmin(axis=1)
+    image = Image.frombytes("P", (rgba.shape[1], rgba.shape[0]), nearest.astype(np.uint8)[inverse].tobytes())
+    image.putpalette(palette.tobytes())
+    return image
+
+
+def iter_gif(frames, fps=DEFAULT_FPS):
+    """Encode RGBA frames as a looping GIF, yielding its bytes frame by frame.
+
+    Each frame after the first stores only the bounding box of the pixels
+    that changed, on top of the previous frame. Frames that change nothing
+    lengthen the previous frame's delay instead.
+    """
+    import numpy as np
+    from PIL import GifImagePlugin, Image
+
+    palette = gif_palette()
+    delay = 1000 / fps
+    previous = None
+    pending = None  # (image, offset, delay): a frame's delay is final once the next frame differs
+
+    def encode(image, offset, duration):
+        return b"".join(GifImagePlugin.getdata(image, offset, duration=round(duration), disposal=1))
+
+    for frame in frames:
+        if previous is None:
+            height, width = frame.shape[:2]
+            header = Image.new("P", (width, height))
+            header.putpalette(palette.tobytes())
+            chunks, _ = GifImagePlugin.getheader(header, info={"loop": 0, "optimize": False})
+            yield b"".join(chunks)
+            previous = np.empty((height, width), dtype=np.uint32)
+            box = (0, 0, width, height)
+        else:
+            # One uint32 per RGBA pixel makes the comparison a single pass.
+            changed = frame.view(np.uint32)[:, :, 0] != previous
+            rows = np.flatnonzero(changed.any(axis=1))
+            if not len(rows):
+                pending = (*pending[:2], pending[2] + delay)
+                continue
+            columns = np.flatnonzero(changed.any(axis=0))
+            box = (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1)
+        if pending is not None:
+            yield encode(*pending)
+        left, top, right, bottom = box
+        pending = (_palette_image(frame[top:bottom, left:right], palette), (int(left), int(top)), delay)
+        np.copyto(previous, frame.view(np.uint32)[:, :, 0])
+    if pending is not None:
+        yield encode(*pending[:2], pending[2] + 1000 * HOLD_SECONDS)
+    yield b";"
+
+
+def iter_ffmpeg(frames, fmt, fps=DEFAULT_FPS):
+    """Encode RGBA frames with ``ffmpeg``, yielding the container bytes as they come."""
+    if not ffmpeg_available():
+        raise RuntimeError("MP4 and WebM animations need ffmpeg on the PATH; GIF works without it.")
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape[:2]
+    process = subprocess.Popen(
+        ["ffmpeg", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{width}x{height}",
+         "-r", str(fps), "-i", "pipe:0", *ANIMATION_FORMATS[fmt]["codec"], "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    # Feed the frames from a thread so ffmpeg's output pipe never fills up
+    # while this generator is blocked writing its input.
+    failure = []
+
+    def feed():
+        try:
+            process.stdin.write(first.tobytes())
+            for frame in frames:
+                process.stdin.write(frame.tobytes())
+        except OSError as error:  # ffmpeg exited early; raised once its output is read
+            failure.append(error)
+        finally:
+            process.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        while chunk := process.stdout.read(CHUNK_SIZE):
+            yield chunk
+    finally:
+        feeder.join()
+        process.stdout.close()
+        errors = process.stderr.read().decode("utf-8", "replace").strip()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {fmt}: {errors or process.returncode}")
+    if failure:
+        raise failure[0]
+
+
+def iter_animation(result, config, fmt="gif", title=None, seconds=DEFAULT_SECONDS, fps=DEFAULT_FPS):
+    """The encoded animation of ``result`` as a generator of byte chunks."""
+    if fmt not in ANIMATION_FORMATS:
+        raise ValueError(f"Unknown animation format {fmt!r}; choose one of {list(ANIMATION_FORMATS)}.")
+    frames = iter_frames(result, config, title, seconds, fps)
+    if fmt == "gif":
+        return iter_gif(frames, fps)
+    return iter_ffmpeg(frames, fmt, fps)
+
+
+def render_animation(result, config, fmt="gif", title=None, seconds=DEFAULT_SECONDS, fps=DEFAULT_FPS):
+    """The encoded animation of ``result`` as bytes; repeated clips come from the cache."""
+    def encode():
+        with timed("render_animation", format=fmt):
+            data = b"".join(iter_animation(result, config, fmt, title, seconds, fps))
+        observe("animation_bytes", len(data), format=fmt)
+        return data
+
+    return render_cache.get_or_compute(("animation", result.key, fmt, title or "", seconds, fps), encode)
+
+
+def main(argv=None):
+    from equilibrium.engine import simulate
+    from equilibrium.generate import load_configs_arg
+    from equilibrium.render import plot_title
+    from equilibrium.sampling import ADAPTIVE_SAMPLES
+
+    parser = argparse.ArgumentParser(description="Animate a saved config's graph building up over time.")
+    parser.add_argument("--configs", required=True, help="JSON or YAML list of configs; the first is animated")
+    parser.add_argument("--format", default="gif", choices=list(ANIMATION_FORMATS))
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS)
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS)
+    parser.add_argument("--no-title", action="store_true")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args(argv)
+    if args.format not in available_formats():
+        parser.error(f"--format {args.format} needs ffmpeg on the PATH")
+
+    config = load_configs_arg(parser, args.configs)[0]
+    result = simulate(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+    title = None if args.no_title else plot_title(config.get("reaction_choice", "Unknown Reaction"),
+                                                  config["selected_reaction"]["delta_H"])
+    tmp = f"{args.out}.tmp"
+    with open(tmp, "wb") as handle:
+        for chunk in iter_animation(result, config, args.format, title, args.seconds, args.fps):
+            handle.write(chunk)
+    os.replace(tmp, args.out)
+    print(f"Wrote {args.out}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
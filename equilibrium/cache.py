@@ -0,0 +1,165 @@
+"""A small in-process LRU cache with a memory budget and hit/miss counters."""
+
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+# Only these keys of a saved config change the simulated trajectories.
+# "reaction_choice" is just a display name and is left out of the key.
+CONFIG_KEYS = [
+    "phase_changes",
+    "temp_effects",
+    "vol_effects",
+    "A_perturb_list",
+    "B_perturb_list",
+    "C_perturb_list",
+    "D_perturb_list",
+]
+REACTION_KEYS = ["a", "b", "c", "d", "delta_H"]
+
+
+def _canonical_number(value):
+    # 1 and 1.0 hash the same, and so do 0.0 and -0.0.
+    value = float(value)
+    return 0.0 if value == 0 else value
+
+
+def canonical_config(config):
+    """Strip a saved config down to the fields that affect the simulation."""
+    canonical = {"selected_reaction": canonical_reaction(config)}
+    canonical["phase_changes"] = list(config["phase_changes"])
+    for key in CONFIG_KEYS[1:]:
+        canonical[key] = [_canonical_number(v) for v in config[key]]
+    return canonical
+
+
+def canonical_reaction(config):
+    reaction = config["selected_reaction"]
+    return {k: _canonical_number(reaction[k]) for k in REACTION_KEYS}
+
+
+def canonical_boundary(config, i):
+    """The change type and the slider values that matter for boundary ``i``."""
+    change = config["phase_changes"][i]
+    if change == "Temperature":
+        values = [config["temp_effects"][i]]
+    elif change == "Volume/Pressure":
+        values = [config["vol_effects"][i]]
+    elif change == "Addition":
+        values = [config[f"{s}_perturb_list"][i] for s in "ABCD"]
+    else:
+        values = []
+    return [change] + [_canonical_number(v) for v in values]
+
+
+def make_key(*parts):
+    """Hash any JSON-serialisable parts into a short stable hex key."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def config_key(config, **options):
+    """Content-addressed key for a saved config plus any engine options."""
+    return make_key(canonical_config(config), options)
+
+
+def sizeof(value):
+    # numpy arrays and bytes report their buffer size; anything else can
+    # provide an ``nbytes`` attribute of its own.
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU mapping evicted by total byte size.
+
+    Streamlit runs every session on its own script thread inside one server
+    process, so a module-level instance is shared by all sessions.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Never cache something that would evict everything else.
+                return value
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def resize(self, max_bytes=None, max_entries=None):
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if max_entries is not None:
+                self.max_entries = max_entries
+            self._evict()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _evict(self):
+        while self._entries and (
+            self.current_bytes > self.max_bytes
+            or (self.max_entries is not None and len(self._entries) > self.max_entries)
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+
+_MISSING = object()
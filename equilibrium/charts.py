@@ -0,0 +1,169 @@
+"""Interactive Vega-Lite (Altair) charts of simulation results.
+
+The whole trajectory is sent to the browser once, with one legend entry per
+species and phase. Clicking legend entries shows/hides lines entirely in the
+browser, so toggling visibility never reruns the page script.
+"""
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from equilibrium.reactions import SPECIES, SPECIES_COLORS
+from equilibrium.render import DISPLAY_DPI, FIGSIZE, render_cache, thin_species
+from equilibrium.sampling import points_per_phase
+
+# Browsers draw the chart at roughly the page width; one point per pixel
+# column of a ~1000 px wide chart is plenty.
+CHART_WIDTH_PX = DISPLAY_DPI * FIGSIZE[0]
+
+
+def series_name(species, phase):
+    return f"{species} Phase {phase + 1}"
+
+
+def chart_data(result, stoich=(1, 1, 1, 1)):
+    """Long-format rows (time, concentration, species, series) for ``result``.
+
+    Each phase after the first starts with the previous phase's last point, so
+    the vertical boundary connection belongs to the phase it leads into and
+    disappears with it.
+    """
+    n_points = points_per_phase(CHART_WIDTH_PX, len(result.sols))
+    frames = []
+    for column, species in enumerate(SPECIES):
+        if stoich[column] == 0:
+            continue
+        previous = None
+        for i, (t, sol) in enumerate(zip(*thin_species(result, column, n_points))):
+            concentration = sol[:, column]
+            if previous is not None:
+                t = np.concatenate([[t[0]], t])
+                concentration = np.concatenate([[previous], concentration])
+            previous = concentration[-1]
+            frames.append(pd.DataFrame({
+                "time": t,
+                "concentration": concentration,
+                "species": species,
+                "series": series_name(species, i),
+                "order": np.arange(len(t)),
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def band_data(result, stoich=(1, 1, 1, 1)):
+    """Rows (time, lower, upper, species, series, band) for the percentile
+    bands of a stochastic result, thinned by striding."""
+    n_points = points_per_phase(CHART_WIDTH_PX, len(result.sols))
+    frames = []
+    for (low, high), (lowers, uppers) in result.bands.items():
+        for i, (t, lower, upper) in enumerate(zip(result.t_phases, lowers, uppers)):
+            step = max(1, int(np.ceil(len(t) / n_points)))
+            for column, species in enumerate(SPECIES):
+                if stoich[column] == 0:
+                    continue
+                frames.append(pd.DataFrame({
+                    "time": t[::step],
+                    "lower": lower[::step, column],
+                    "upper": upper[::step, column],
+                    "species": species,
+                    "series": series_name(species, i),
+                    "band": f"{low}–{high}th percentile",
+                }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def trajectory_chart(result, stoich=(1, 1, 1, 1), title=None):
+    """An Altair chart whose legend shows and hides each species/phase line.
+
+    Stochastic results (with ``bands``) get a shaded area per percentile band
+    under the ensemble mean.
+    """
+    data = render_cache.get_or_compute(("chart-data", result.key, tuple(stoich)),
+                                       lambda: chart_data(result, stoich))
+    n_phases = len(result.sols)
+    present = [species for species, order in zip(SPECIES, stoich) if order != 0]
+    domain = [series_name(species, i) for species in present for i in range(n_phases)]
+    colors = [SPECIES_COLORS[species] for species in present for _ in range(n_phases)]
+
+    # The selection holds the hidden series: empty (nothing hidden) matches
+    # nothing, and each legend click hides or shows one line, like the
+    # static image's checkboxes.
+    hidden = alt.selection_point(name="hidden", fields=["series"], bind="legend", toggle="true", empty=False)
+    chart = alt.Chart(data).mark_line(strokeWidth=2).transform_calculate(
+        # A conditional tooltip takes a single field, so it is built here.
+        label="datum.series + ': t = ' + format(datum.time, '.1f') + ', ' + format(datum.concentration, '.4f')"
+    ).encode(
+        x=alt.X("time:Q", title="Time"),
+        y=alt.Y("concentration:Q", title="Concentration"),
+        color=alt.Color(
+            "series:N",
+            scale=alt.Scale(domain=domain, range=colors),
+            legend=alt.Legend(title="Click to hide or show a line", columns=n_phases),
+        ),
+        detail="series:N",
+        order="order:Q",
+        opacity=alt.condition(hidden, alt.value(0.0), alt.value(1.0)),
+        # Hidden lines are still there, so they must not answer the mouse.
+        tooltip=alt.condition(hidden, alt.value(""), alt.Tooltip("label:N")),
+    ).add_params(hidden)
+    if getattr(result, "bands", None):
+        bands = render_cache.get_or_compute(("band-data", result.key, tuple(stoich)),
+                                            lambda: band_data(result, stoich))
+        area = alt.Chart(bands).mark_area(opacity=0.15).transform_calculate(
+            label="datum.series + ' ' + datum.band + ': t = ' + format(datum.time, '.1f') + ', '"
+                  " + format(datum.lower, '.4f') + '–' + format(datum.upper, '.4f')"
+        ).encode(
+            x="time:Q",
+            y="lower:Q",
+            y2="upper:Q",
+            color=alt.Color("series:N", scale=alt.Scale(domain=domain, range=colors)),
+            detail="band:N",
+            # Hidden series hide their bands too.
+            opacity=alt.condition(hidden, alt.value(0.0), alt.value(0.15)),
+            tooltip=alt.condition(hidden, alt.value(""), alt.Tooltip("label:N")),
+        )
+        chart = alt.layer(area, chart)
+    if title:
+        chart = chart.properties(title=title)
+    return chart.properties(height=500)
+
+
+def _cell_edges(values):
+    # Cells centred on the grid values, touching their neighbours.
+    step = (values[-1] - values[0]) / (len(values) - 1) if len(values) > 1 else 1.0
+    return values - step / 2, values + step / 2
+
+
+def sweep_chart(axes, values, titles, value_title):
+    """A line (one axis) or heatmap (two axes) of ``values`` over a sweep grid.
+
+    ``values`` has the grid's shape; NaN cells (not computed yet) are left out.
+    """
+    if len(axes) == 1:
+        data = pd.DataFrame({"x": axes[0], "value": values}).dropna()
+        return alt.Chart(data).mark_line(point=True).encode(
+            x=alt.X("x:Q", title=titles[0], scale=alt.Scale(domain=[axes[0][0], axes[0][-1]], nice=False)),
+            y=alt.Y("value:Q", title=value_title),
+            tooltip=[alt.Tooltip("x:Q", title=titles[0], format=".3f"),
+                     alt.Tooltip("value:Q", title=value_title, format=".4f")],
+        ).properties(height=500)
+
+    x, y = np.meshgrid(axes[0], axes[1], indexing="ij")
+    x_low, x_high = _cell_edges(axes[0])
+    y_low, y_high = _cell_edges(axes[1])
+    data = pd.DataFrame({
+        "x": x.ravel(), "y": y.ravel(), "value": np.asarray(values).ravel(),
+        "x1": np.repeat(x_low, len(axes[1])), "x2": np.repeat(x_high, len(axes[1])),
+        "y1": np.tile(y_low, len(axes[0])), "y2": np.tile(y_high, len(axes[0])),
+    }).dropna()
+    return alt.Chart(data).mark_rect().encode(
+        x=alt.X("x1:Q", title=titles[0], scale=alt.Scale(domain=[x_low[0], x_high[-1]], nice=False)),
+        x2="x2:Q",
+        y=alt.Y("y1:Q", title=titles[1], scale=alt.Scale(domain=[y_low[0], y_high[-1]], nice=False)),
+        y2="y2:Q",
+        color=alt.Color("value:Q", title=value_title, scale=alt.Scale(scheme="viridis")),
+        tooltip=[alt.Tooltip("x:Q", title=titles[0], format=".3f"),
+                 alt.Tooltip("y:Q", title=titles[1], format=".3f"),
+                 alt.Tooltip("value:Q", title=value_title, format=".4f")],
+    ).properties(height=500)
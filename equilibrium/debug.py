@@ -0,0 +1,51 @@
+"""The collapsible performance panel shown in the page sidebars."""
+
+import os
+
+import streamlit as st
+
+from equilibrium import metrics
+
+
+def _caches():
+    # Imported here so that pages which never simulate do not load the engine.
+    from equilibrium.engine import phase_cache, result_cache
+    from equilibrium.render import render_cache
+
+    return {"result": result_cache, "phase": phase_cache, "render": render_cache}
+
+
+def debug_enabled():
+    """Show the panel with ``EQUILIBRIUM_DEBUG=1`` or a ``?debug=1`` URL."""
+    return os.environ.get("EQUILIBRIUM_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+
+def debug_sidebar(page):
+    """Finish this run's trace, export it and, if enabled, show it in the sidebar."""
+    events = metrics.stop_trace()
+    if metrics.METRICS_FILE:
+        metrics.export(page, events, _caches())
+    if not debug_enabled():
+        return
+    import pandas as pd
+
+    caches = _caches()
+    summary = metrics.summarize_trace(events)
+    with st.sidebar.expander("Debug: performance", expanded=False):
+        if summary["stages"]:
+            st.dataframe(pd.DataFrame([
+                {"stage": stage, "calls": info["calls"], "total ms": 1e3 * info["total_s"],
+                 "max ms": 1e3 * info["max_s"]}
+                for stage, info in summary["stages"].items()
+            ]), hide_index=True)
+        else:
+            st.caption("Nothing was computed in this run.")
+        for name, value in summary["counters"].items():
+            st.text(f"{name}: {value}")
+        if summary["image_bytes"]:
+            st.text(f"image bytes: {', '.join(str(size) for size in summary['image_bytes'])}")
+        st.dataframe(pd.DataFrame([
+            {"cache": name, "entries": stats["entries"], "MB": stats["bytes"] / 2**20,
+             "hit rate": stats["hit_rate"]}
+            for name, stats in ((name, cache.stats()) for name, cache in caches.items())
+        ]), hide_index=True)
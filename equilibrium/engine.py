@@ -0,0 +1,192 @@
+"""The four-phase equilibrium simulation shared by the Simulation and MCQ pages."""
+
+import os
+
+import numpy as np
+
+from equilibrium.cache import ResultCache, canonical_boundary, canonical_reaction, config_key, make_key
+from equilibrium.metrics import increment, timed
+from equilibrium.reactions import INIT_STATE, K1_BASE, K2_BASE, PHASE_SAMPLES
+from equilibrium.sampling import phase_time_grid
+from equilibrium.solver import DEFAULT_ATOL, DEFAULT_RTOL, integrate_phase
+from equilibrium.steady import integrate_phase_early_stop, solve_equilibrium
+
+# "full" integrates every sample of each phase window; "early_stop" (always
+# LSODA, whatever ``method`` says) stops once the phase has settled and fills
+# the rest of the window analytically.
+MODES = ["full", "early_stop"]
+
+# One result cache per server process, shared by every session and page.
+# The budget can be tuned per deployment without touching the code.
+result_cache = ResultCache(
+    max_bytes=int(float(os.environ.get("EQUILIBRIUM_CACHE_MB", "256")) * 1024 * 1024)
+)
+# Individual phases, keyed by the reaction, the engine options and the settings
+# of every boundary before the phase. Editing boundary k leaves the keys of
+# phases 1..k unchanged, so only the phases after it are integrated again.
+phase_cache = ResultCache(
+    max_bytes=int(float(os.environ.get("EQUILIBRIUM_PHASE_CACHE_MB", "128")) * 1024 * 1024)
+)
+
+
+class SimulationResult:
+    """Trajectories for every phase of one saved configuration."""
+
+    def __init__(self, key, t_phases, sols, stats=None):
+        self.key = key
+        self.t_phases = t_phases
+        self.sols = sols
+        # Per-phase solver statistics (backend, nfev, njev, ...).
+        self.stats = stats or []
+        # Results are shared between sessions, so nobody may edit them in place.
+        for array in self.t_phases + self.sols:
+            array.flags.writeable = False
+
+    def __setstate__(self, state):
+        # Arrays unpickled from a worker process come back writeable.
+        self.__dict__.update(state)
+        for array in self.t_phases + self.sols:
+            array.flags.writeable = False
+
+    @property
+    def nbytes(self):
+        return sum(t.nbytes for t in self.t_phases) + sum(s.nbytes for s in self.sols)
+
+
+class PhaseSegment:
+    """One integrated phase and the rate constants it was integrated with."""
+
+    def __init__(self, t_phase, sol, stats, k1, k2):
+        self.t_phase = t_phase
+        self.sol = sol
+        self.stats = stats
+        self.k1 = k1
+        self.k2 = k2
+
+    @property
+    def nbytes(self):
+        return self.t_phase.nbytes + self.sol.nbytes
+
+
+def apply_boundary(state, k1, k2, config, i):
+    """Apply the change saved for boundary ``i`` and return the new (state, k1, k2)."""
+    state = np.array(state, dtype=float)
+    current_boundary = config["phase_changes"][i]
+    if current_boundary == "Temperature":
+        effect = config["temp_effects"][i]
+        if config["selected_reaction"]["delta_H"] < 0:
+            k2 = K2_BASE * (1 + effect)
+        else:
+            k1 = K1_BASE * (1 + effect)
+    elif current_boundary == "Volume/Pressure":
+        effect = config["vol_effects"][i]
+        state = state / (1 + effect)
+    elif current_boundary == "Addition":
+        state[0] *= (1 + config["A_perturb_list"][i])
+        state[1] *= (1 + config["B_perturb_list"][i])
+        state[2] *= (1 + config["C_perturb_list"][i])
+        state[3] *= (1 + config["D_perturb_list"][i])
+    return state, k1, k2
+
+
+def _stoichiometry(config):
+    reaction = config["selected_reaction"]
+    return (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+
+
+def phase_keys(config, **options):
+    """The ``phase_cache`` key of every phase of ``config`` under the engine ``options``."""
+    prefix = [canonical_reaction(config), options]
+    keys = [make_key(*prefix)]
+    for i in range(len(config["phase_changes"])):
+        prefix.append(canonical_boundary(config, i))
+        keys.append(make_key(*prefix))
+    return keys
+
+
+def run_simulation(config, method="odeint", rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL, mode="full",
+                   samples=PHASE_SAMPLES, sampling="uniform"):
+    """Simulate ``config`` without consulting the result cache.
+
+    Phases are still taken from ``phase_cache`` when the same reaction, options
+    and preceding boundaries have been integrated before.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown simulation mode {mode!r}; choose one of {MODES}.")
+    stoich = _stoichiometry(config)
+    options = dict(method=method, rtol=rtol, atol=atol, mode=mode, samples=samples, sampling=sampling)
+    keys = phase_keys(config, **options)
+    k1_current = K1_BASE
+    k2_current = K2_BASE
+    init_state = list(INIT_STATE)
+
+    # There is one phase before the first boundary and one after each boundary.
+    n_phases = len(config["phase_changes"]) + 1
+    sols = []
+    t_phases = []
+    stats = []
+
+    for i in range(n_phases):
+        phase_key = keys[i]
+        segment = phase_cache.get(phase_key)
+        if segment is None:
+            t_phase = phase_time_grid(i, samples, sampling)
+            with timed("integrate_phase", backend="LSODA" if mode == "early_stop" else method):
+                if mode == "early_stop":
+                    sol, phase_stats = integrate_phase_early_stop(init_state, t_phase, k1_current, k2_current,
+                                                                  stoich, rtol=rtol, atol=atol)
+                else:
+                    sol, phase_stats = integrate_phase(init_state, t_phase, k1_current, k2_current, stoich,
+                                                       method=method, rtol=rtol, atol=atol)
+            increment("solver_rhs_evaluations_total", phase_stats["nfev"], backend=phase_stats["backend"])
+            increment("solver_jacobian_evaluations_total", phase_stats["njev"], backend=phase_stats["backend"])
+            segment = phase_cache.put(phase_key, PhaseSegment(t_phase, sol, phase_stats,
+                                                              k1_current, k2_current))
+        else:
+            increment("phase_cache_hits_total")
+        sols.append(segment.sol)
+        t_phases.append(segment.t_phase)
+        stats.append(segment.stats)
+        if i < n_phases - 1:
+            with timed("apply_boundary"):
+                init_state, k1_current, k2_current = apply_boundary(
+                    segment.sol[-1], segment.k1, segment.k2, config, i
+                )
+    return SimulationResult(config_key(config, **options), t_phases, sols, stats)
+
+
+def simulate(config, method="odeint", rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL, mode="full",
+             samples=PHASE_SAMPLES, sampling="uniform"):
+    """Return the (possibly cached) simulation result for a saved config.
+
+    ``method`` picks the solver backend (see ``equilibrium.solver.BACKENDS``),
+    ``mode`` one of ``MODES`` and ``sampling`` one of
+    ``equilibrium.sampling.SAMPLINGS`` with ``samples`` points per phase. All
+    of them are part of the cache key, as are the tolerances.
+    """
+    options = dict(method=method, rtol=rtol, atol=atol, mode=mode, samples=samples, sampling=sampling)
+    return result_cache.get_or_compute(
+        config_key(config, **options), lambda: run_simulation(config, **options)
+    )
+
+
+def equilibrium_states(config):
+    """Start and equilibrium state of every phase, without integrating.
+
+    Each phase is assumed to settle before its boundary, so the boundary is
+    applied to the previous phase's equilibrium. Returns two (phases, 4)
+    arrays: the state each phase starts from and the state it settles at.
+    """
+    stoich = _stoichiometry(config)
+    k1_current = K1_BASE
+    k2_current = K2_BASE
+    state = np.array(INIT_STATE, dtype=float)
+    n_phases = len(config["phase_changes"]) + 1
+    starts = np.empty((n_phases, 4))
+    ends = np.empty((n_phases, 4))
+    for i in range(n_phases):
+        starts[i] = state
+        ends[i] = solve_equilibrium(state, k1_current, k2_current, stoich)
+        if i < n_phases - 1:
+            state, k1_current, k2_current = apply_boundary(ends[i], k1_current, k2_current, config, i)
+    return starts, ends
@@ -0,0 +1,246 @@
+"""Export simulation results as data files, and many configs as one ZIP.
+
+Every exporter is a generator of byte chunks, so a result or a whole class
+worth of configs is written piece by piece. The bulk ZIP holds one directory
+per config with its graph, data and config. It is assembled entry by entry,
+so only one config's arrays and image exist at a time.
+
+Formats:
+
+``csv``      text; ``long`` layout by default
+``npz``      compressed NumPy archive
+``parquet``  one row group per phase in the ``long`` layout (needs pyarrow)
+``arrow``    Arrow IPC file, one record batch per phase (needs pyarrow)
+
+The ``long`` layout has one row per sample with ``phase``, ``time`` and one
+column per species. The ``wide`` layout has per-phase/per-species columns
+(``phase1_time``, ``phase1_A``, ...), which works because every phase has
+the same number of samples. ``float32`` halves the size of every format.
+
+Streamlit's ``download_button`` takes a callable rather than a generator. The
+pages pass one that joins the chunks, so nothing is built until the button
+is clicked. Streamlit then keeps the whole download as bytes in its media
+storage, whatever the callable returns, so a bulk ZIP made on the page sits
+in server memory in full. Only the command line streams it to disk::
+
+    python -m equilibrium.export --configs class.json --format parquet --float32 --out class.zip
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import zipfile
+
+from equilibrium.reactions import SPECIES
+
+FORMATS = {
+    "csv": {"extension": "csv", "mime": "text/csv"},
+    "npz": {"extension": "npz", "mime": "application/octet-stream"},
+    "parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+    "arrow": {"extension": "arrow", "mime": "application/vnd.apache.arrow.file"},
+}
+LAYOUTS = ["long", "wide"]
+
+
+def _present_species(config):
+    reaction = config["selected_reaction"]
+    return [species for species, key in zip(SPECIES, "abcd") if reaction[key] != 0]
+
+
+def result_columns(result, species=SPECIES, layout="long", float32=False):
+    """Yield dicts of equally long column arrays, one per chunk of rows.
+
+    ``long`` yields one chunk per phase; ``wide`` yields a single chunk.
+    """
+    import numpy as np
+
+    dtype = np.float32 if float32 else np.float64
+    indices = [SPECIES.index(name) for name in species]
+    if layout == "long":
+        for i, (t, sol) in enumerate(zip(result.t_phases, result.sols)):
+            columns = {"phase": np.full(len(t), i + 1, dtype=np.int8), "time": t.astype(dtype)}
+            columns.update((name, sol[:, j].astype(dtype)) for name, j in zip(species, indices))
+            yield columns
+    elif layout == "wide":
+        columns = {}
+        for i, (t, sol) in enumerate(zip(result.t_phases, result.sols)):
+            columns[f"phase{i + 1}_time"] = t.astype(dtype)
+            columns.update((f"phase{i + 1}_{name}", sol[:, j].astype(dtype))
+                           for name, j in zip(species, indices))
+        yield columns
+    else:
+        raise ValueError(f"Unknown layout {layout!r}; choose one of {LAYOUTS}.")
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only stream whose contents are collected with ``drain``."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # zipfile and pyarrow only need the position, never to seek.
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_csv(chunks, float32=False):
+    import numpy as np
+
+    fmt = "%.9g" if float32 else "%.17g"
+    header = True
+    for columns in chunks:
+        if header:
+            yield (",".join(columns) + "\n").encode("ascii")
+            header = False
+        buffer = io.StringIO()
+        np.savetxt(buffer, np.column_stack(list(columns.values())), fmt=fmt, delimiter=",")
+        yield buffer.getvalue().encode("ascii")
+
+
+def iter_npz(chunks):
+    import numpy as np
+
+    chunks = list(chunks)
+    arrays = {name: np.concatenate([columns[name] for columns in chunks]) for name in chunks[0]}
+    sink = _ChunkSink()
+    np.savez_compressed(sink, **arrays)
+    yield sink.drain()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Arrow export need pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def iter_parquet(chunks):
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for columns in chunks:
+        table = pa.table(columns)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression="zstd")
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_arrow(chunks):
+    pa = _require_pyarrow()
+
+    sink = _ChunkSink()
+    writer = None
+    for columns in chunks:
+        batch = pa.record_batch(columns)
+        if writer is None:
+            writer = pa.ipc.new_file(sink, batch.schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_result(result, config, fmt="csv", layout="long", float32=False):
+    """Byte chunks of ``result`` in ``fmt``, with a column per species in ``config``'s reaction."""
+    chunks = result_columns(result, _present_species(config), layout, float32)
+    if fmt == "csv":
+        return iter_csv(chunks, float32)
+    if fmt == "npz":
+        return iter_npz(chunks)
+    if fmt == "parquet":
+        return iter_parquet(chunks)
+    if fmt == "arrow":
+        return iter_arrow(chunks)
+    raise ValueError(f"Unknown export format {fmt!r}; choose one of {list(FORMATS)}.")
+
+
+def export_name(config, fmt):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", config.get("reaction_choice", "reaction")).strip("_").lower()
+    return f"{slug}.{FORMATS[fmt]['extension']}"
+
+
+def iter_zip(configs, fmt="csv", layout="long", float32=False, images=True):
+    """Byte chunks of a ZIP with ``NNNN_<reaction>/`` holding ``graph.png``,
+    ``data.<ext>`` and ``config.json`` for every config.
+
+    The configs are simulated one at a time in the worker pool. One that
+    cannot be (the pool is busy, or the job times out or fails) gets an
+    ``error.txt`` in its directory instead of the graph and data.
+    """
+    from equilibrium.render import all_visible, build_figure, plot_title, render_to_bytes
+    from equilibrium.workers import PoolBusy, SimulationTimeout, WorkerError, simulate
+
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, config in enumerate(configs):
+            folder = f"{index:04d}_{export_name(config, fmt).rsplit('.', 1)[0]}"
+            archive.writestr(f"{folder}/config.json", json.dumps(config, ensure_ascii=False, indent=1))
+            # Not stored, so a bulk export does not evict the results
+            # students are looking at.
+            try:
+                result = simulate(config, store=False)
+            except (PoolBusy, SimulationTimeout, WorkerError) as error:
+                archive.writestr(f"{folder}/error.txt", f"{type(error).__name__}: {error}\n")
+                yield sink.drain()
+                continue
+            with archive.open(f"{folder}/data.{FORMATS[fmt]['extension']}", "w") as entry:
+                for chunk in iter_result(result, config, fmt, layout, float32):
+                    entry.write(chunk)
+                    yield sink.drain()
+            if images:
+                reaction = config["selected_reaction"]
+                stoich = (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+                title = plot_title(config.get("reaction_choice", "Unknown Reaction"), reaction["delta_H"])
+                image = render_to_bytes(build_figure(result, all_visible(len(result.sols), stoich), title))
+                archive.writestr(f"{folder}/graph.png", image, compress_type=zipfile.ZIP_STORED)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def main(argv=None):
+    from equilibrium.generate import load_configs_arg
+
+    parser = argparse.ArgumentParser(description="Export many configs' data and graphs as one ZIP.")
+    parser.add_argument("--configs", required=True, help="JSON or YAML file holding a list of configs")
+    parser.add_argument("--format", default="csv", choices=list(FORMATS))
+    parser.add_argument("--layout", default="long", choices=LAYOUTS)
+    parser.add_argument("--float32", action="store_true", help="store concentrations and times as float32")
+    parser.add_argument("--no-images", action="store_true", help="leave out the PNG graphs")
+    parser.add_argument("--out", required=True, help="ZIP file to write")
+    args = parser.parse_args(argv)
+
+    configs = load_configs_arg(parser, args.configs)
+    tmp = f"{args.out}.tmp"
+    with open(tmp, "wb") as handle:
+        for chunk in iter_zip(configs, args.format, args.layout, args.float32, not args.no_images):
+            handle.write(chunk)
+    os.replace(tmp, args.out)
+    print(f"Wrote {len(configs)} configs to {args.out}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
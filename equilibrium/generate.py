@@ -0,0 +1,243 @@
+"""Generate equilibrium graphs and answer keys from the command line.
+
+Examples::
+
+    # 20,000 random worksheet graphs over every preset, on all cores
+    python -m equilibrium.generate --random 20000 --seed 7 --out worksheets/
+
+    # Graphs for configs saved from the setup page (JSON or YAML list)
+    python -m equilibrium.generate --configs class.json --out class_graphs/
+
+Each item is written as ``<id>.png`` plus ``<id>.json`` (config and answer
+key) as soon as it is done, and one line is appended to ``manifest.jsonl``.
+The JSON file is written last and atomically, so re-running the same command
+after a crash skips every item that was already finished, and first adds the
+manifest lines of any finished items the crash kept out of the manifest.
+
+An item that fails is listed in ``failures.jsonl`` with its error, and the
+run goes on with the rest. The next run retries the failed items.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from equilibrium.reactions import reaction_options, random_config
+
+
+def parse_configs(text, name="configs.json"):
+    """Parse a JSON or YAML (by ``name``'s extension) list of configs.
+
+    Configs may give just ``reaction_choice``; ``selected_reaction`` is then
+    filled in from the presets. Raises ``ImportError`` for YAML without PyYAML.
+    """
+    if name.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("Reading YAML configs needs PyYAML: pip install pyyaml") from None
+        configs = yaml.safe_load(text)
+    else:
+        configs = json.loads(text)
+    for config in configs:
+        if "selected_reaction" not in config:
+            config["selected_reaction"] = reaction_options[config["reaction_choice"]]
+    return configs
+
+
+def load_configs(path):
+    """Read a JSON or YAML list of configs from ``path`` (see ``parse_configs``)."""
+    with open(path, encoding="utf-8") as handle:
+        return parse_configs(handle.read(), path)
+
+
+def load_configs_arg(parser, path):
+    """``load_configs`` for a command line: a missing PyYAML ends the program
+    with a usage error rather than a traceback."""
+    try:
+        return load_configs(path)
+    except ImportError as error:
+        parser.error(str(error))
+
+
+def iter_tasks(args, configs=None):
+    """Yield ``(item_id, config, hidden_boundary)`` without building the whole list.
+
+    ``configs`` is the already loaded ``--configs`` list, if any.
+    """
+    if args.configs:
+        configs = enumerate(load_configs(args.configs) if configs is None else configs)
+    else:
+        # One RNG per item keeps every item reproducible on its own, so a
+        # resumed run regenerates exactly the configs it skipped.
+        configs = ((i, random_config(random.Random(f"{args.seed}-{i}"), args.boundaries))
+                   for i in range(args.random))
+    for index, config in configs:
+        hidden = None
+        if args.quiz:
+            hidden = random.Random(f"{args.seed}-quiz-{index}").randrange(len(config["phase_changes"]))
+        yield f"{index:06d}", config, hidden
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+
+
+def render_item(item_id, config, hidden_boundary, out_dir, fmt="png", dpi=None):
+    """Simulate, render and write one item. Runs inside a worker process."""
+    from equilibrium.engine import run_simulation
+    from equilibrium.quiz import answer_key, quiz_visibility
+    from equilibrium.render import DPI, all_visible, build_figure, plot_title, render_to_bytes
+    from equilibrium.sampling import ADAPTIVE_SAMPLES
+
+    reaction = config["selected_reaction"]
+    stoich = (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+    result = run_simulation(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+    n_phases = len(result.sols)
+    if hidden_boundary is None:
+        visibility = all_visible(n_phases, stoich)
+    else:
+        visibility = quiz_visibility(stoich, n_phases, hidden_boundary)
+    title = plot_title(config.get("reaction_choice", "Unknown Reaction"), reaction["delta_H"])
+    dpi = dpi or DPI
+    image = render_to_bytes(build_figure(result, visibility, title, dpi), fmt, dpi)
+
+    record = {
+        "id": item_id,
+        "image": f"{item_id}.{fmt}",
+        "config": config,
+        "hidden_boundary": hidden_boundary,
+        "answers": answer_key(config),
+    }
+    _write_atomic(os.path.join(out_dir, record["image"]), image)
+    _write_atomic(os.path.join(out_dir, f"{item_id}.json"),
+                  json.dumps(record, ensure_ascii=False, indent=1).encode("utf-8"))
+    return record
+
+
+def _manifest_line(record):
+    return json.dumps({"id": record["id"], "image": record["image"], "answers": record["answers"]},
+                      ensure_ascii=False) + "\n"
+
+
+def repair_manifest(out_dir):
+    """Give every finished ``<id>.json`` in ``out_dir`` its manifest line.
+
+    Workers write the item files and the parent appends the manifest line
+    later, so a crash in between leaves finished items out of the manifest,
+    and possibly a torn last line. Returns the number of lines added.
+    """
+    manifest_path = os.path.join(out_dir, "manifest.jsonl")
+    lines, ids = [], set()
+    torn = False
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    ids.add(json.loads(line)["id"])
+                except (ValueError, KeyError):
+                    torn = True
+                    continue
+                torn = torn or not line.endswith("\n")
+                lines.append(line.rstrip("\n") + "\n")
+    missing = []
+    for name in sorted(os.listdir(out_dir)):
+        item_id, extension = os.path.splitext(name)
+        if extension == ".json" and item_id not in ids:
+            with open(os.path.join(out_dir, name), encoding="utf-8") as handle:
+                missing.append(_manifest_line(json.load(handle)))
+    if missing or torn:
+        _write_atomic(manifest_path, "".join(lines + missing).encode("utf-8"))
+    return len(missing)
+
+
+def run(args, configs=None):
+    os.makedirs(args.out, exist_ok=True)
+    repaired = repair_manifest(args.out)
+    done = skipped = failed = 0
+    # Keep only a few jobs per worker in flight so memory stays flat however
+    # many items are requested.
+    max_in_flight = 4 * (args.workers or os.cpu_count())
+    pool = ProcessPoolExecutor(max_workers=args.workers)
+    try:
+        with open(os.path.join(args.out, "manifest.jsonl"), "a", encoding="utf-8") as manifest, \
+                open(os.path.join(args.out, "failures.jsonl"), "w", encoding="utf-8") as failures:
+            pending = {}
+            for item_id, config, hidden in iter_tasks(args, configs):
+                if os.path.exists(os.path.join(args.out, f"{item_id}.json")):
+                    skipped += 1
+                    continue
+                pending[pool.submit(render_item, item_id, config, hidden, args.out,
+                                    args.format, args.dpi)] = item_id
+                if len(pending) >= max_in_flight:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    ok, errors, broken = _record(finished, pending, manifest, failures)
+                    done, failed = done + ok, failed + errors
+                    if broken:
+                        # A worker died and took the pool with it; its other
+                        # jobs have failed too. Carry on with a fresh pool.
+                        ok, errors, _ = _record(wait(pending)[0], pending, manifest, failures)
+                        done, failed = done + ok, failed + errors
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(max_workers=args.workers)
+            ok, errors, _ = _record(wait(pending)[0], pending, manifest, failures)
+            done, failed = done + ok, failed + errors
+    finally:
+        pool.shutdown()
+    print(f"Wrote {done} items to {args.out} ({skipped} already present"
+          + (f", {repaired} added to the manifest" if repaired else "") + ").", file=sys.stderr)
+    if failed:
+        print(f"{failed} items failed; see failures.jsonl. Run the same command again to retry them.",
+              file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _record(futures, pending, manifest, failures):
+    """Write the manifest or failure line of each finished future and drop it
+    from ``pending``. Returns (done, failed, whether the pool broke)."""
+    done = failed = 0
+    broken = False
+    for future in futures:
+        item_id = pending.pop(future)
+        try:
+            record = future.result()
+        except Exception as error:  # one bad item must not end an overnight run
+            broken = broken or isinstance(error, BrokenProcessPool)
+            failures.write(json.dumps({"id": item_id, "error": "".join(
+                traceback.format_exception_only(type(error), error)).strip()}, ensure_ascii=False) + "\n")
+            failed += 1
+        else:
+            manifest.write(_manifest_line(record))
+            done += 1
+    manifest.flush()
+    failures.flush()
+    return done, failed, broken
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--configs", help="JSON or YAML file holding a list of configs")
+    source.add_argument("--random", type=int, help="generate this many random configs")
+    parser.add_argument("--seed", default="0", help="seed for --random and --quiz (default: 0)")
+    parser.add_argument("--boundaries", type=int, default=3, help="boundaries per random config")
+    parser.add_argument("--quiz", action="store_true",
+                        help="hide B after one random boundary, as the MCQ page does")
+    parser.add_argument("--format", default="png", choices=["png", "svg"])
+    parser.add_argument("--dpi", type=int, help="image resolution (default: the pages' 200 dpi)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", required=True, help="output directory")
+    args = parser.parse_args(argv)
+    return run(args, load_configs_arg(parser, args.configs) if args.configs else None)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Timings and counters for the simulation hot path.
+
+The engine, the renderer and the pages report what they do through
+``timed``, ``observe`` and ``increment``. Everything goes into one
+process-wide ``registry``, which can be exported for aggregation across
+sessions. The page scripts also call ``start_trace`` to collect the events
+of a single run for the debug panel (see ``equilibrium.debug``). Simulation
+workers send their events back with each result, and ``record`` and
+``add_to_trace`` file them here.
+
+Recording costs a couple of ``perf_counter`` calls and a locked dict update,
+so it is always on. Exporting is opt-in through ``EQUILIBRIUM_METRICS_FILE``:
+
+``*.prom``
+    Rewritten after every page run in the Prometheus text format, e.g. for
+    node_exporter's textfile collector.
+anything else
+    One JSON line appended per page run.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = os.environ.get("EQUILIBRIUM_METRICS_FILE")
+PREFIX = "equilibrium_"
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(label_key):
+    if not label_key:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, value.replace('"', '\\"')) for name, value in label_key) + "}"
+
+
+class MetricsRegistry:
+    """Process-wide summaries (count/sum/max) and counters, keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._counters = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0, 0.0, float("-inf")])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self._summaries.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "summaries": [{"name": name, "labels": dict(labels), "count": count, "sum": total, "max": peak}
+                              for (name, labels), (count, total, peak) in sorted(self._summaries.items())],
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self._counters.items())],
+            }
+
+    def to_prometheus(self, gauges=None):
+        """The registry, plus ``{(name, label_key): value}`` gauges, in the Prometheus text format."""
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for summary in snapshot["summaries"]:
+            labels = _format_labels(_label_key(summary["labels"]))
+            declare(summary["name"], "summary")
+            lines.append(f"{PREFIX}{summary['name']}_count{labels} {summary['count']}")
+            lines.append(f"{PREFIX}{summary['name']}_sum{labels} {summary['sum']!r}")
+        for counter in snapshot["counters"]:
+            declare(counter["name"], "counter")
+            lines.append(f"{PREFIX}{counter['name']}{_format_labels(_label_key(counter['labels']))} "
+                         f"{counter['value']!r}")
+        for (name, label_key), value in sorted((gauges or {}).items()):
+            declare(name, "gauge")
+            lines.append(f"{PREFIX}{name}{_format_labels(label_key)} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+_local = threading.local()
+_export_lock = threading.Lock()
+
+
+def _trace(kind, name, value, labels):
+    events = getattr(_local, "events", None)
+    if events is not None:
+        events.append({"kind": kind, "name": name, "value": value, **labels})
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+    _trace("observe", name, value, labels)
+
+
+def increment(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+    _trace("increment", name, value, labels)
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Record the wall time of the block as ``stage_seconds{stage=...}``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+
+def record(events):
+    """Add events recorded elsewhere (in a simulation worker) to the registry."""
+    for event in events:
+        labels = {name: value for name, value in event.items() if name not in ("kind", "name", "value")}
+        if event["kind"] == "observe":
+            registry.observe(event["name"], event["value"], **labels)
+        else:
+            registry.increment(event["name"], event["value"], **labels)
+
+
+def add_to_trace(events):
+    """Append events recorded elsewhere to this thread's trace, if it has one."""
+    trace = getattr(_local, "events", None)
+    if trace is not None:
+        trace.extend(events)
+
+
+def start_trace():
+    """Start collecting this thread's events into a new list, and return it.
+
+    Streamlit runs each script run in its own thread, so a page's trace only
+    holds the work done for that run.
+    """
+    _local.events = []
+    return _local.events
+
+
+def stop_trace():
+    events = getattr(_local, "events", None) or []
+    _local.events = None
+    return events
+
+
+def summarize_trace(events):
+    """Per-stage call counts and times plus counter totals for one trace."""
+    stages = {}
+    counters = {}
+    image_bytes = []
+    for event in events:
+        if event["name"] == "stage_seconds":
+            stage = stages.setdefault(event["stage"], {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+            stage["calls"] += 1
+            stage["total_s"] += event["value"]
+            stage["max_s"] = max(stage["max_s"], event["value"])
+        elif event["name"] == "image_bytes":
+            image_bytes.append(event["value"])
+        elif event["kind"] == "increment":
+            label = ",".join(f"{k}={v}" for k, v in event.items() if k not in ("kind", "name", "value"))
+            name = f"{event['name']}{{{label}}}" if label else event["name"]
+            counters[name] = counters.get(name, 0) + event["value"]
+    return {"stages": stages, "counters": counters, "image_bytes": image_bytes}
+
+
+def cache_gauges(caches):
+    """Prometheus gauges for ``{name: ResultCache}``."""
+    gauges = {}
+    for cache_name, cache in caches.items():
+        for field, value in cache.stats().items():
+            gauges[(f"cache_{field}", (("cache", cache_name),))] = value
+    return gauges
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    os.replace(tmp, path)
+
+
+def export(page, events, caches, path=METRICS_FILE):
+    """Write the metrics to ``path`` (see the module docstring); no-op without one."""
+    if not path:
+        return
+    if path.endswith(".prom"):
+        text = registry.to_prometheus(cache_gauges(caches))
+        with _export_lock:
+            _write_atomic(path, text)
+        return
+    record = {
+        "time": time.time(),
+        "page": page,
+        **summarize_trace(events),
+        "caches": {name: cache.stats() for name, cache in caches.items()},
+    }
+    with _export_lock, open(path, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(record) + "\n")
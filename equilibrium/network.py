@@ -0,0 +1,212 @@
+"""Mass-action simulation of arbitrary reversible reaction networks.
+
+A network of S species and R reversible reactions is described by two (R, S)
+matrices of stoichiometric coefficients, one for the reactant side and one
+for the product side. With ``N = products - reactants``::
+
+    dx/dt = Nᵀ (r_f - r_r),    r_f[j] = kf[j] * Π_i x_i^reactants[j, i]
+
+``Nᵀ`` is kept as a sparse matrix, the rate laws are evaluated for all
+reactions at once from padded (R, M) index/order arrays (M = the most
+species on one side of any reaction), and the Jacobian ``Nᵀ · ∂r/∂x`` is
+assembled as a sparse matrix for the stiff solvers. The existing presets are
+the special case of one reaction over species A, B, C, D.
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.integrate import solve_ivp
+
+from equilibrium.reactions import (
+    INIT_STATE, K1_BASE, K2_BASE, PHASE_DURATION, PHASE_SAMPLES, SPECIES, reaction_options,
+)
+from equilibrium.solver import DEFAULT_ATOL, DEFAULT_RTOL, SolverError
+
+NETWORK_BACKENDS = ["BDF", "Radau", "LSODA"]
+
+
+def _padded_side(matrix):
+    # Per reaction, the species on one side and their orders, padded with
+    # the index of a virtual species that is always 1 and has order 0.
+    n_reactions, n_species = matrix.shape
+    width = max(int((matrix > 0).sum(axis=1).max()), 1)
+    index = np.full((n_reactions, width), n_species)
+    order = np.zeros((n_reactions, width))
+    for j in range(n_reactions):
+        (present,) = np.nonzero(matrix[j])
+        index[j, :len(present)] = present
+        order[j, :len(present)] = matrix[j, present]
+    return index, order
+
+
+def _mass_action(x_ext, index, order, k):
+    """Rates k * Π x^order and their partial derivatives per padded slot."""
+    terms = x_ext[index] ** order
+    # Product of every other slot, from prefix and suffix cumulative products,
+    # so the derivative stays finite when a concentration is zero.
+    ones = np.ones((terms.shape[0], 1))
+    before = np.cumprod(np.hstack([ones, terms[:, :-1]]), axis=1)
+    after = np.cumprod(np.hstack([ones, terms[:, :0:-1]]), axis=1)[:, ::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(order > 0, order * x_ext[index] ** (order - 1), 0.0)
+    return k * before[:, -1] * terms[:, -1], k[:, None] * slope * before * after
+
+
+class ReactionNetwork:
+    """Species, reversible reactions and their base rate constants."""
+
+    def __init__(self, species, reactants, products, k_forward, k_reverse, delta_H=None):
+        self.species = list(species)
+        self.reactants = np.asarray(reactants, dtype=float)
+        self.products = np.asarray(products, dtype=float)
+        self.k_forward = np.asarray(k_forward, dtype=float)
+        self.k_reverse = np.asarray(k_reverse, dtype=float)
+        n_reactions, n_species = self.reactants.shape
+        if self.products.shape != (n_reactions, n_species) or n_species != len(self.species):
+            raise ValueError("reactants and products must both be (reactions, species) matrices.")
+        self.delta_H = np.zeros(n_reactions) if delta_H is None else np.asarray(delta_H, dtype=float)
+
+        self.net_transpose = sparse.csr_matrix((self.products - self.reactants).T)
+        self._forward_index, self._forward_order = _padded_side(self.reactants)
+        self._reverse_index, self._reverse_order = _padded_side(self.products)
+
+    @classmethod
+    def from_reactions(cls, species, reactions):
+        """Build a network from ``{"reactants": {name: coeff}, "products": {...},
+        "kf": ..., "kr": ..., "delta_H": ...}`` dicts."""
+        position = {name: i for i, name in enumerate(species)}
+        reactants = np.zeros((len(reactions), len(species)))
+        products = np.zeros((len(reactions), len(species)))
+        for j, reaction in enumerate(reactions):
+            for name, coeff in reaction.get("reactants", {}).items():
+                reactants[j, position[name]] = coeff
+            for name, coeff in reaction.get("products", {}).items():
+                products[j, position[name]] = coeff
+        return cls(species, reactants, products,
+                   [reaction["kf"] for reaction in reactions],
+                   [reaction["kr"] for reaction in reactions],
+                   [reaction.get("delta_H", 0.0) for reaction in reactions])
+
+    @property
+    def n_species(self):
+        return len(self.species)
+
+    def rates(self, x, k_forward, k_reverse):
+        """Net rate of every reaction."""
+        x_ext = np.append(x, 1.0)
+        forward, _ = _mass_action(x_ext, self._forward_index, self._forward_order, k_forward)
+        reverse, _ = _mass_action(x_ext, self._reverse_index, self._reverse_order, k_reverse)
+        return forward - reverse
+
+    def rhs(self, t, x, k_forward, k_reverse):
+        return self.net_transpose @ self.rates(x, k_forward, k_reverse)
+
+    def jacobian(self, t, x, k_forward, k_reverse):
+        """Sparse (S, S) Jacobian of ``rhs``."""
+        x_ext = np.append(x, 1.0)
+        _, d_forward = _mass_action(x_ext, self._forward_index, self._forward_order, k_forward)
+        _, d_reverse = _mass_action(x_ext, self._reverse_index, self._reverse_order, k_reverse)
+        rows = np.concatenate([np.repeat(np.arange(len(d_forward)), d_forward.shape[1]),
+                               np.repeat(np.arange(len(d_reverse)), d_reverse.shape[1])])
+        cols = np.concatenate([self._forward_index.ravel(), self._reverse_index.ravel()])
+        values = np.concatenate([d_forward.ravel(), -d_reverse.ravel()])
+        # Drop the padding slots, which point at the virtual species.
+        real = cols < self.n_species
+        d_rates = sparse.csr_matrix((values[real], (rows[real], cols[real])),
+                                    shape=(len(d_forward), self.n_species))
+        return (self.net_transpose @ d_rates).tocsc()
+
+
+def network_from_reaction(reaction, k1=K1_BASE, k2=K2_BASE):
+    """One of the ``reaction_options`` presets as a one-reaction network over A-D."""
+    return ReactionNetwork(
+        SPECIES,
+        [[reaction["a"], reaction["b"], 0, 0]],
+        [[0, 0, reaction["c"], reaction["d"]]],
+        [k1], [k2], [reaction["delta_H"]],
+    )
+
+
+def preset_networks():
+    return {name: network_from_reaction(reaction) for name, reaction in reaction_options.items()}
+
+
+def boundaries_from_config(config):
+    """Translate a saved config's boundary lists into ``simulate_network`` boundaries."""
+    boundaries = []
+    for i, change in enumerate(config["phase_changes"]):
+        if change == "Temperature":
+            boundaries.append({"type": change, "effect": config["temp_effects"][i]})
+        elif change == "Volume/Pressure":
+            boundaries.append({"type": change, "effect": config["vol_effects"][i]})
+        else:
+            boundaries.append({"type": change,
+                               "perturb": {s: config[f"{s}_perturb_list"][i] for s in SPECIES}})
+    return boundaries
+
+
+def apply_network_boundary(network, state, k_forward, k_reverse, boundary):
+    """Apply one boundary to the state vector and rate constants.
+
+    Temperature scales the reverse constant of exothermic reactions and the
+    forward constant of the others, relative to the network's base values,
+    exactly as ``engine.apply_boundary`` does for a single reaction.
+    """
+    state = np.array(state, dtype=float)
+    if boundary["type"] == "Temperature":
+        factor = 1 + boundary["effect"]
+        exothermic = network.delta_H < 0
+        k_reverse = np.where(exothermic, network.k_reverse * factor, k_reverse)
+        k_forward = np.where(~exothermic, network.k_forward * factor, k_forward)
+    elif boundary["type"] == "Volume/Pressure":
+        state = state / (1 + boundary["effect"])
+    elif boundary["type"] == "Addition":
+        perturb = np.zeros(network.n_species)
+        for name, value in boundary["perturb"].items():
+            perturb[network.species.index(name)] = value
+        state = state * (1 + perturb)
+    return state, k_forward, k_reverse
+
+
+def simulate_network(network, y0, boundaries, method="BDF", rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL,
+                     samples=PHASE_SAMPLES):
+    """Integrate ``network`` through one phase per boundary plus the base phase.
+
+    Returns ``(t_phases, sols, stats)`` with each ``sols[i]`` of shape
+    (samples, species).
+    """
+    if method not in NETWORK_BACKENDS:
+        raise ValueError(f"Unknown network backend {method!r}; choose one of {NETWORK_BACKENDS}.")
+    state = np.asarray(y0, dtype=float)
+    k_forward = network.k_forward.copy()
+    k_reverse = network.k_reverse.copy()
+    if method == "LSODA":
+        # LSODA only takes dense Jacobians; fine for small networks.
+        def jac(t, x, kf, kr):
+            return network.jacobian(t, x, kf, kr).toarray()
+    else:
+        jac = network.jacobian
+
+    t_phases, sols, stats = [], [], []
+    for i in range(len(boundaries) + 1):
+        t_phase = np.linspace(i * PHASE_DURATION, (i + 1) * PHASE_DURATION, samples)
+        out = solve_ivp(network.rhs, (t_phase[0], t_phase[-1]), state, method=method,
+                        t_eval=t_phase, args=(k_forward, k_reverse), jac=jac, rtol=rtol, atol=atol)
+        if not out.success:
+            raise SolverError(f"{method} failed: {out.message}")
+        sol = out.y.T
+        t_phases.append(t_phase)
+        sols.append(sol)
+        stats.append({"backend": method, "nfev": int(out.nfev), "njev": int(out.njev)})
+        if i < len(boundaries):
+            state, k_forward, k_reverse = apply_network_boundary(
+                network, sol[-1], k_forward, k_reverse, boundaries[i]
+            )
+    return t_phases, sols, stats
+
+
+def simulate_config_as_network(config, method="BDF", rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """Run a saved config through the network engine, e.g. to cross-check it."""
+    network = network_from_reaction(config["selected_reaction"])
+    return simulate_network(network, INIT_STATE, boundaries_from_config(config),
+                            method=method, rtol=rtol, atol=atol)
@@ -0,0 +1,102 @@
+"""Answer keys for the boundary questions the MCQ page asks."""
+
+
+def quiz_visibility(stoich, n_phases, hidden_boundary):
+    """Show every species present except B in the phase after ``hidden_boundary``."""
+    return tuple(
+        tuple(order != 0 and not (column == 1 and i == hidden_boundary + 1) for i in range(n_phases))
+        for column, order in enumerate(stoich)
+    )
+
+
+def direction_of(slider_value):
+    if slider_value > 0:
+        return "Increase"
+    if slider_value < 0:
+        return "Decrease"
+    return "No change"
+
+
+def boundary_answer(config, index):
+    """The correct answers for boundary ``index`` (0-based) of ``config``.
+
+    Returns a dict with the change type (stage 1), the slider value it is
+    graded on, the expected direction (stage 2) and the stage 2 question text.
+    """
+    label = index + 1
+    change_type = config["phase_changes"][index]
+    if change_type == "Temperature":
+        slider_value = config["temp_effects"][index]
+        question = f"At Boundary {label}, was the temperature increased or decreased?"
+    elif change_type == "Volume/Pressure":
+        slider_value = config["vol_effects"][index]
+        question = f"At Boundary {label}, was the volume/pressure increased or decreased?"
+    elif change_type == "Addition":
+        # For addition, check the perturbation for reagent A if available.
+        if config["selected_reaction"]["a"] != 0:
+            slider_value = config["A_perturb_list"][index]
+        else:
+            slider_value = 0.0
+        question = f"At Boundary {label}, did the addition indicate an increase or decrease for reagent A?"
+    else:
+        slider_value = 0.0
+        question = f"What was the direction of the change at Boundary {label}?"
+    return {
+        "boundary": label,
+        "change_type": change_type,
+        "slider_value": slider_value,
+        "direction": direction_of(slider_value),
+        "direction_question": question,
+    }
+
+
+def answer_key(config):
+    """``boundary_answer`` for every boundary of ``config``."""
+    return [boundary_answer(config, i) for i in range(len(config["phase_changes"]))]
+
+
+# Below this |d[X]/d(slider)| the equilibrium counts as unchanged.
+SHIFT_TOLERANCE = 1e-6
+SLIDER_NAMES = {
+    "temp_effects": "temperature effect",
+    "vol_effects": "volume/pressure effect",
+    "A_perturb_list": "amount of A added",
+    "B_perturb_list": "amount of B added",
+    "C_perturb_list": "amount of C added",
+    "D_perturb_list": "amount of D added",
+}
+
+
+def graded_slider(config, index):
+    """The ``(field, boundary)`` slider a Le Chatelier question about boundary
+    ``index`` varies: the one stage 2 is graded on, or for an addition
+    without A, the first species that can be added."""
+    change_type = config["phase_changes"][index]
+    if change_type == "Temperature":
+        return ("temp_effects", index)
+    if change_type == "Volume/Pressure":
+        return ("vol_effects", index)
+    reaction = config["selected_reaction"]
+    species = next(s for s, key in zip("ABCD", "abcd") if reaction[key] != 0)
+    return (f"{species}_perturb_list", index)
+
+
+def shift_answer(config, index, species, sensitivities):
+    """Stage 3: would ``species`` settle higher or lower after boundary
+    ``index`` if its slider had been set slightly higher?
+
+    Graded by the sign of the sensitivity of that equilibrium
+    concentration (``sensitivity.SensitivityResult``) to the slider.
+    """
+    parameter = graded_slider(config, index)
+    slope = float(sensitivities.gradient(index + 1, parameter)["ABCD".index(species)])
+    if slope > SHIFT_TOLERANCE:
+        direction = "Higher"
+    elif slope < -SHIFT_TOLERANCE:
+        direction = "Lower"
+    else:
+        direction = "No change"
+    question = (f"Suppose the {SLIDER_NAMES[parameter[0]]} at Boundary {index + 1} had been set slightly "
+                f"higher. Would the equilibrium concentration of {species} after that boundary be higher or lower?")
+    return {"parameter": parameter, "species": species, "slope": slope, "direction": direction,
+            "question": question}
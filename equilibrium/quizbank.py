@@ -0,0 +1,257 @@
+"""A precomputed, memory-mapped bank of MCQ quiz items.
+
+A bank is a directory holding:
+
+``items.json``
+    One record per item (config, hidden boundary, answers, the stage 3 shift
+    answer for every species present, difficulty and where its image lives)
+    plus an index by reaction, change type, difficulty and config key.
+``times.npy``
+    The (phases, samples) time grid shared by every item.
+``trajectories.npy``
+    A float32 (configs, phases, samples, 4) block, opened memory-mapped; the
+    items built from one config share its row.
+``images.bin``
+    Every pre-rendered PNG back to back, also memory-mapped.
+
+Opening a bank reads only the metadata; serving an item is a dict lookup plus
+a slice of the mapped files, with no integration or rendering.
+
+A bank is built in a sibling directory and swapped in when complete, so
+rebuilding one that a running server has mapped never truncates its files.
+
+Build one with::
+
+    python -m equilibrium.quizbank --random 2000 --out quiz_bank/
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from equilibrium.cache import config_key
+from equilibrium.quiz import answer_key, quiz_visibility, shift_answer
+from equilibrium.reactions import random_config
+
+# numpy, the engine and the renderer are imported where they are used, so the
+# MCQ page can look for a bank without paying for them.
+
+# The MCQ page looks for a bank here unless EQUILIBRIUM_QUIZ_BANK says otherwise.
+DEFAULT_BANK_DIR = os.environ.get(
+    "EQUILIBRIUM_QUIZ_BANK", os.path.join(os.path.dirname(os.path.dirname(__file__)), "quiz_bank")
+)
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+# Worksheet-sized images keep a bank of thousands of items to a few hundred MB.
+BANK_DPI = 100
+
+
+def difficulty_of(slider_value):
+    """Bigger changes leave a more obvious mark on the graph."""
+    size = abs(slider_value)
+    if size >= 0.3:
+        return "Easy"
+    if size >= 0.15:
+        return "Medium"
+    return "Hard"
+
+
+def _config_items(config, dpi):
+    # Everything for one config: one simulation and one sensitivity solve,
+    # one image per hidden boundary.
+    import numpy as np
+
+    from equilibrium.engine import run_simulation
+    from equilibrium.render import build_figure, plot_title, render_to_bytes
+    from equilibrium.sampling import ADAPTIVE_SAMPLES
+    from equilibrium.sensitivity import run_sensitivities
+
+    reaction = config["selected_reaction"]
+    stoich = (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+    result = run_simulation(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+    title = plot_title(config["reaction_choice"], reaction["delta_H"])
+    answers = answer_key(config)
+    sensitivities = run_sensitivities(config)
+    present = [species for species, order in zip("ABCD", stoich) if order != 0]
+    items = []
+    for hidden, answer in enumerate(answers):
+        visibility = quiz_visibility(stoich, len(result.sols), hidden)
+        image = render_to_bytes(build_figure(result, visibility, title, dpi), "png", dpi)
+        items.append(({
+            "config": config,
+            "config_key": config_key(config),
+            "hidden_boundary": hidden,
+            "reaction": config["reaction_choice"],
+            "change_type": answer["change_type"],
+            "difficulty": difficulty_of(answer["slider_value"]),
+            "answers": answers,
+            "shifts": {species: shift_answer(config, hidden, species, sensitivities) for species in present},
+        }, image))
+    return np.array(result.t_phases), np.array(result.sols, dtype=np.float32), items
+
+
+def build_quiz_bank(path, configs, workers=None, dpi=BANK_DPI):
+    """Simulate and render every boundary of every config into a bank at ``path``.
+
+    All configs need the same number of boundaries, since the trajectories
+    share one array. An existing bank at ``path`` is replaced only once the
+    new one is complete.
+    """
+    configs = list(configs)
+    if len({len(config["phase_changes"]) for config in configs}) != 1:
+        raise ValueError("All configs in a quiz bank need the same number of boundaries.")
+    path = os.path.abspath(path)
+    parent, name = os.path.split(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{name}-", dir=parent)
+    os.chmod(staging, 0o755)
+    try:
+        count = _write_bank(staging, configs, workers, dpi)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    # Servers keep the old files mapped (and readable) until they reopen the
+    # bank; see open_quiz_bank.
+    retired = None
+    if os.path.exists(path):
+        retired = tempfile.mkdtemp(prefix=f".{name}-old-", dir=parent)
+        os.replace(path, os.path.join(retired, name))
+    os.replace(staging, path)
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
+    return count
+
+
+def _write_bank(path, configs, workers, dpi):
+    # The bank files for ``configs`` in the (empty) directory ``path``.
+    import numpy as np
+
+    items = []
+    blocks = []
+    times = None
+    offset = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(os.path.join(path, "images.bin"), "wb") as images:
+        for t_phases, sols, config_items in pool.map(_config_items, configs,
+                                                    [dpi] * len(configs), chunksize=8):
+            times = t_phases
+            for record, image in config_items:
+                record["id"] = len(items)
+                record["trajectory"] = len(blocks)
+                record["image_offset"] = offset
+                record["image_size"] = len(image)
+                images.write(image)
+                offset += len(image)
+                items.append(record)
+            blocks.append(sols)
+
+    np.save(os.path.join(path, "trajectories.npy"), np.stack(blocks))
+    np.save(os.path.join(path, "times.npy"), times)
+    index = {"reaction": {}, "change_type": {}, "difficulty": {}, "config": {}}
+    for record in items:
+        for field in ("reaction", "change_type", "difficulty"):
+            index[field].setdefault(record[field], []).append(record["id"])
+        index["config"][f"{record['config_key']}:{record['hidden_boundary']}"] = record["id"]
+    with open(os.path.join(path, "items.json"), "w", encoding="utf-8") as handle:
+        json.dump({"items": items, "index": index}, handle, ensure_ascii=False)
+    return len(items)
+
+
+class QuizBank:
+    """Read-only view of a bank directory built by ``build_quiz_bank``."""
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        with open(os.path.join(path, "items.json"), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        self.items = meta["items"]
+        self.index = meta["index"]
+        self.times = np.load(os.path.join(path, "times.npy"))
+        self.trajectories = np.load(os.path.join(path, "trajectories.npy"), mmap_mode="r")
+        self._images = np.memmap(os.path.join(path, "images.bin"), dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return len(self.items)
+
+    def find(self, config, hidden_boundary):
+        """The item id for ``config`` with ``hidden_boundary`` hidden, or None."""
+        return self.index["config"].get(f"{config_key(config)}:{hidden_boundary}")
+
+    def select(self, reaction=None, change_type=None, difficulty=None):
+        """Ids of the items matching every filter that is not None."""
+        ids = None
+        for field, value in (("reaction", reaction), ("change_type", change_type),
+                             ("difficulty", difficulty)):
+            if value is not None:
+                matching = set(self.index[field].get(value, []))
+                ids = matching if ids is None else ids & matching
+        return sorted(ids) if ids is not None else list(range(len(self.items)))
+
+    def image(self, item_id):
+        record = self.items[item_id]
+        start = record["image_offset"]
+        return self._images[start:start + record["image_size"]].tobytes()
+
+    def result(self, item_id):
+        import numpy as np
+
+        from equilibrium.engine import SimulationResult
+
+        record = self.items[item_id]
+        sols = np.asarray(self.trajectories[record["trajectory"]], dtype=float)
+        return SimulationResult(f"bank:{record['config_key']}", list(self.times.copy()), list(sols))
+
+
+# Path -> ((inode, mtime) of its items.json, QuizBank).
+_open_banks = {}
+
+
+def open_quiz_bank(path=DEFAULT_BANK_DIR):
+    """The bank at ``path``, opened once per process; None if there is none yet.
+
+    A bank built or rebuilt while the server runs shows up on the next page
+    run: the cached one is reopened when its ``items.json`` is replaced.
+    """
+    try:
+        stat = os.stat(os.path.join(path, "items.json"))
+    except FileNotFoundError:
+        _open_banks.pop(path, None)
+        return None
+    stamp = (stat.st_ino, stat.st_mtime_ns)
+    cached = _open_banks.get(path)
+    if cached is None or cached[0] != stamp:
+        cached = _open_banks[path] = (stamp, QuizBank(path))
+    return cached[1]
+
+
+def main(argv=None):
+    from equilibrium.generate import load_configs_arg
+
+    parser = argparse.ArgumentParser(description="Build a precomputed MCQ quiz bank.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--configs", help="JSON or YAML file holding a list of configs")
+    source.add_argument("--random", type=int, help="generate this many random configs")
+    parser.add_argument("--seed", default="0", help="seed for --random (default: 0)")
+    parser.add_argument("--boundaries", type=int, default=3, help="boundaries per random config")
+    parser.add_argument("--dpi", type=int, default=BANK_DPI)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default=DEFAULT_BANK_DIR, help="bank directory")
+    args = parser.parse_args(argv)
+
+    if args.configs:
+        configs = load_configs_arg(parser, args.configs)
+    else:
+        configs = [random_config(random.Random(f"{args.seed}-{i}"), args.boundaries)
+                   for i in range(args.random)]
+    count = build_quiz_bank(args.out, configs, workers=args.workers, dpi=args.dpi)
+    print(f"Wrote {count} quiz items to {args.out}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Reaction presets and the constants shared by every page."""
+
+# Define a dictionary of example reactions with approximate ΔH values.
+reaction_options = {
+    "Haber Process (N₂ + 3H₂ ↔ 2NH₃)": {"a": 1, "b": 3, "c": 2, "d": 0, "delta_H": -92},
+    "Contact Reaction (2SO₂ + O₂ ↔ 2SO₃)": {"a": 2, "b": 1, "c": 2, "d": 0, "delta_H": -197},
+    "Ethanol Production (C₆H₁₂O₆ ↔ 2C₂H₅OH + 2CO₂)": {"a": 1, "b": 0, "c": 2, "d": 2, "delta_H": -218},
+    "Calcium Carbonate Decomposition (CaCO₃ ↔ CaO + CO₂)": {"a": 1, "b": 0, "c": 1, "d": 1, "delta_H": +178},
+    "Dissolution of Ammonium Chloride (NH₄Cl ↔ NH₄⁺ + Cl⁻)": {"a": 1, "b": 0, "c": 1, "d": 1, "delta_H": +15},
+    "Dissolution of Ammonium Nitrate (NH₄NO₃ ↔ NH₄⁺ + NO₃⁻)": {"a": 1, "b": 0, "c": 1, "d": 1, "delta_H": +25},
+}
+
+CHANGE_TYPES = ["Temperature", "Volume/Pressure", "Addition"]
+
+# The setup page offers between 1 and MAX_BOUNDARIES boundaries.
+DEFAULT_BOUNDARIES = 3
+MAX_BOUNDARIES = 10
+SPECIES = ["A", "B", "C", "D"]
+SPECIES_COLORS = {"A": "blue", "B": "red", "C": "green", "D": "purple"}
+
+# Base rate constants and the starting state used by every simulation.
+K1_BASE = 0.02
+K2_BASE = 0.01
+INIT_STATE = (1.0, 1.0, 0.0, 0.0)
+
+# Each phase is integrated over a fixed window of this length.
+PHASE_DURATION = 200
+PHASE_SAMPLES = 1000
+
+# Slider ranges and step used by the setup page, per change type.
+SLIDER_STEP = 0.05
+TEMP_EFFECT_RANGE = (-1.0, 1.0)
+VOL_EFFECT_RANGE = (-0.5, 0.5)
+PERTURB_RANGE = (-0.5, 0.5)
+
+
+def _random_slider(rng, value_range):
+    low, high = value_range
+    steps = int(round((high - low) / SLIDER_STEP))
+    return round(low + SLIDER_STEP * rng.randint(0, steps), 2)
+
+
+def random_config(rng, n_boundaries=DEFAULT_BOUNDARIES, reaction_choice=None):
+    """A config shaped exactly like the one the setup page saves.
+
+    ``rng`` is a ``random.Random``; slider values are drawn on the page's
+    0.05 grid, and only the sliders the page would show are non-zero.
+    """
+    if reaction_choice is None:
+        reaction_choice = rng.choice(list(reaction_options))
+    selected_reaction = reaction_options[reaction_choice]
+    config = {
+        "reaction_choice": reaction_choice,
+        "selected_reaction": selected_reaction,
+        "phase_changes": [],
+        "temp_effects": [],
+        "vol_effects": [],
+    }
+    for species in SPECIES:
+        config[f"{species}_perturb_list"] = []
+    for _ in range(n_boundaries):
+        change_type = rng.choice(CHANGE_TYPES)
+        config["phase_changes"].append(change_type)
+        temp = _random_slider(rng, TEMP_EFFECT_RANGE) if change_type == "Temperature" else 0.0
+        vol = _random_slider(rng, VOL_EFFECT_RANGE) if change_type == "Volume/Pressure" else 0.0
+        config["temp_effects"].append(temp)
+        config["vol_effects"].append(vol)
+        for species, key in zip(SPECIES, "abcd"):
+            shown = change_type == "Addition" and selected_reaction[key] != 0
+            config[f"{species}_perturb_list"].append(_random_slider(rng, PERTURB_RANGE) if shown else 0.0)
+    return config
+
+
+def default_config(reaction_choice, n_boundaries=DEFAULT_BOUNDARIES):
+    """The config the setup page saves if nothing but the reaction is changed."""
+    config = {
+        "reaction_choice": reaction_choice,
+        "selected_reaction": reaction_options[reaction_choice],
+        "phase_changes": ["Temperature"] * n_boundaries,
+        "temp_effects": [0.0] * n_boundaries,
+        "vol_effects": [0.0] * n_boundaries,
+    }
+    for species in SPECIES:
+        config[f"{species}_perturb_list"] = [0.0] * n_boundaries
+    return config
@@ -0,0 +1,125 @@
+"""Render simulation results to PNG/SVG bytes without touching pyplot state.
+
+Figures are built with the object-oriented ``Figure`` API on an Agg canvas,
+so nothing is registered with pyplot and every figure can be freed as soon as
+its bytes are written. Each species is drawn as one ``LineCollection`` holding
+all of its visible phases and boundary connections, and the encoded bytes are
+cached per (result, visibility, title, format).
+"""
+
+import io
+import os
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+from equilibrium.cache import ResultCache
+from equilibrium.metrics import observe, timed
+from equilibrium.reactions import SPECIES, SPECIES_COLORS
+from equilibrium.sampling import downsample_trajectory, points_per_phase
+
+FIGSIZE = (10, 6)
+# st.pyplot saves at 200 dpi with a tight bounding box; keep the same look.
+DPI = 200
+# The pages show the image about 1000 px wide whatever resolution it is saved
+# at, so curves are thinned to one point per displayed pixel column.
+DISPLAY_DPI = 100
+LINEWIDTH = 2
+BAND_ALPHA = 0.15
+
+render_cache = ResultCache(
+    max_bytes=int(float(os.environ.get("EQUILIBRIUM_RENDER_CACHE_MB", "64")) * 1024 * 1024)
+)
+
+
+def plot_title(reaction_choice, delta_H):
+    return "{}  |  ΔH = {} kJ/mol".format(reaction_choice, delta_H)
+
+
+def all_visible(n_phases, stoich=(1, 1, 1, 1)):
+    """Visibility with every phase of every species present in the reaction shown."""
+    return tuple(tuple(order != 0 for _ in range(n_phases)) for order in stoich)
+
+
+def thin_species(result, column, n_points):
+    """Times and values of one species, each phase thinned by LTTB to about
+    ``n_points`` points. Each species keeps its own points, since every
+    species is drawn as its own collection."""
+    thinned = [downsample_trajectory(t, sol, n_points, columns=[column])
+               for t, sol in zip(result.t_phases, result.sols)]
+    return [t for t, _ in thinned], [sol for _, sol in thinned]
+
+
+def species_segments(t_phases, sols, column, visible):
+    """Polylines for one species: each visible phase plus the vertical
+    connection at every boundary whose phases on both sides are visible."""
+    segments = []
+    for i, (t, sol) in enumerate(zip(t_phases, sols)):
+        if visible[i]:
+            segments.append(np.column_stack([t, sol[:, column]]))
+    for i in range(len(sols) - 1):
+        if visible[i] and visible[i + 1]:
+            t_boundary = t_phases[i][-1]
+            segments.append(np.array([[t_boundary, sols[i][-1, column]],
+                                      [t_boundary, sols[i + 1][0, column]]]))
+    return segments
+
+
+@timed("build_figure")
+def build_figure(result, visibility, title=None, dpi=DPI):
+    """Draw ``result`` on a new Agg-backed ``Figure``.
+
+    ``visibility`` holds one tuple of per-phase flags for each of A, B, C, D.
+    """
+    fig = Figure(figsize=FIGSIZE, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    # Thin each phase to about one point per displayed pixel column.
+    n_points = points_per_phase(FIGSIZE[0] * DISPLAY_DPI, len(result.sols))
+
+    # Percentile bands of a stochastic result, under its mean lines.
+    for lowers, uppers in getattr(result, "bands", {}).values():
+        for column, species in enumerate(SPECIES):
+            for i, (t, lower, upper) in enumerate(zip(result.t_phases, lowers, uppers)):
+                if visibility[column][i]:
+                    ax.fill_between(t, lower[:, column], upper[:, column], color=SPECIES_COLORS[species],
+                                    alpha=BAND_ALPHA, linewidth=0)
+
+    for column, species in enumerate(SPECIES):
+        if not any(visibility[column]):
+            continue
+        t_phases, sols = thin_species(result, column, n_points)
+        segments = species_segments(t_phases, sols, column, visibility[column])
+        if segments:
+            ax.add_collection(LineCollection(segments, colors=SPECIES_COLORS[species],
+                                             linewidths=LINEWIDTH, label=species))
+    ax.autoscale_view()
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Concentration")
+    if title:
+        ax.set_title(title)
+    fig.tight_layout()
+    return fig
+
+
+def render_to_bytes(fig, fmt="png", dpi=DPI):
+    buffer = io.BytesIO()
+    with timed("encode_image", format=fmt):
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+    # Drop the artists right away rather than waiting for the garbage collector.
+    fig.clear()
+    data = buffer.getvalue()
+    observe("image_bytes", len(data), format=fmt)
+    return data
+
+
+def render_result(result, visibility, title=None, fmt="png", dpi=DPI):
+    """Encoded image bytes for ``result``; repeated renders come from the cache."""
+    visibility = tuple(tuple(bool(v) for v in flags) for flags in visibility)
+    key = (result.key, visibility, title or "", fmt, dpi)
+    return render_cache.get_or_compute(
+        key, lambda: render_to_bytes(build_figure(result, visibility, title, dpi), fmt, dpi)
+    )
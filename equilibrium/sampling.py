@@ -0,0 +1,85 @@
+"""Time grids for each phase and shape-preserving downsampling for plots.
+
+Right after a boundary the curves bend sharply; by the end of a phase they are
+nearly flat. An adaptive grid puts the samples where the curvature is, and
+LTTB (Largest-Triangle-Three-Buckets) thins a trajectory to roughly one point
+per pixel column while keeping its visual shape.
+"""
+
+import numpy as np
+
+from equilibrium.reactions import PHASE_DURATION
+
+SAMPLINGS = ["uniform", "adaptive"]
+
+# How strongly the adaptive grid clusters near the start of a phase: the first
+# gap is about CLUSTERING / (e^CLUSTERING - 1) of a uniform gap.
+CLUSTERING = 4.0
+
+# Samples per phase the pages ask for with the adaptive grid.
+ADAPTIVE_SAMPLES = 300
+
+
+def adaptive_time_grid(t0, t1, samples, clustering=CLUSTERING):
+    """``samples`` times from ``t0`` to ``t1``, densest just after ``t0``."""
+    if not clustering:
+        return np.linspace(t0, t1, samples)
+    u = np.linspace(0.0, 1.0, samples)
+    return t0 + (t1 - t0) * np.expm1(clustering * u) / np.expm1(clustering)
+
+
+def phase_time_grid(i, samples, sampling="uniform"):
+    """The output times of phase ``i`` (0-based)."""
+    t0 = i * PHASE_DURATION
+    t1 = (i + 1) * PHASE_DURATION
+    if sampling == "uniform":
+        return np.linspace(t0, t1, samples)
+    if sampling == "adaptive":
+        return adaptive_time_grid(t0, t1, samples)
+    raise ValueError(f"Unknown sampling {sampling!r}; choose one of {SAMPLINGS}.")
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the ``n_out`` points LTTB keeps from the series ``(x, y)``."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # Split everything between the fixed first and last points into
+    # n_out - 2 buckets, and keep from each bucket the point forming the
+    # largest triangle with the previous pick and the next bucket's centroid.
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    keep = np.empty(n_out, dtype=int)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a])
+                       - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(areas))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample_trajectory(t, sol, n_out, columns=None):
+    """Thin one phase to about ``n_out`` points per species.
+
+    LTTB runs on each column in ``columns`` (all four by default) and the union
+    of the kept indices is returned, so the species still share one time axis.
+    """
+    if n_out >= len(t):
+        return t, sol
+    if columns is None:
+        columns = range(sol.shape[1])
+    keep = np.unique(np.concatenate([lttb_indices(t, sol[:, j], n_out) for j in columns]))
+    return t[keep], sol[keep]
+
+
+def points_per_phase(width_px, n_phases):
+    """How many points each phase needs to cover its share of the plot width."""
+    return max(int(width_px // n_phases), 3)
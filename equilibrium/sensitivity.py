@@ -0,0 +1,183 @@
+"""Sensitivities of the equilibrium concentrations to every slider.
+
+Each phase is taken to settle, as in ``engine.equilibrium_states``: phase i
+starts from ``s`` and settles at ``e = s + nu ξ``, where the extent ξ is the
+root of the net rate ``r = k1*A^a*B^b - k2*C^c*D^d``. By the implicit
+function theorem, for any parameter θ::
+
+    dξ/dθ = -(∇r · ds/dθ + F dk1/dθ - R dk2/dθ) / (∇r · nu)
+    de/dθ = ds/dθ + nu dξ/dθ
+
+with ``F = A^a B^b`` and ``R = C^c D^d`` at ``e``. No integration is needed,
+only the equilibrium solves themselves. Where ``∇r · nu`` is 0 (a rate
+constant of 0, or a reaction with nothing left to run) one-sided secants
+stand in. Across boundaries the chain rule carries ``d e / d theta`` for the
+parameters ``theta``:
+
+* the base rate constants ``("k1", None)`` and ``("k2", None)``;
+* every active slider ``(field, boundary)``, named like the sweep
+  parameters: ``temp_effects`` through the rate constant it sets,
+  ``vol_effects`` through ``y / (1 + effect)`` and ``X_perturb_list``
+  through ``y_X * (1 + perturb)``.
+
+These are the slopes of the sweep page's equilibrium chains, not of the
+phase-end values of the time-course plots, which may not have settled yet.
+"""
+
+import numpy as np
+
+from equilibrium.cache import config_key
+from equilibrium.engine import result_cache
+from equilibrium.metrics import timed
+from equilibrium.reactions import INIT_STATE, K1_BASE, K2_BASE, SPECIES
+from equilibrium.solver import build_rate_functions
+from equilibrium.steady import solve_equilibrium
+
+RATE_PARAMETERS = [("k1", None), ("k2", None)]
+# Step of the one-sided secants used where the equilibrium is not differentiable.
+SECANT_STEP = 1e-6
+
+
+class SensitivityResult:
+    """Equilibrium states and their gradients with respect to ``parameters``.
+
+    ``ends`` is (phases, 4) and ``gradients`` (phases, 4, len(parameters)).
+    """
+
+    def __init__(self, key, parameters, ends, gradients):
+        self.key = key
+        self.parameters = parameters
+        self.ends = ends
+        self.gradients = gradients
+        for array in (ends, gradients):
+            array.flags.writeable = False
+
+    def __setstate__(self, state):
+        # Arrays unpickled from a worker process come back writeable.
+        self.__dict__.update(state)
+        for array in (self.ends, self.gradients):
+            array.flags.writeable = False
+
+    @property
+    def nbytes(self):
+        return self.ends.nbytes + self.gradients.nbytes
+
+    def gradient(self, phase, parameter):
+        """d(equilibrium of ``phase``)/d(``parameter``) for A, B, C, D."""
+        return self.gradients[phase, :, self.parameters.index(tuple(parameter))]
+
+    def boundary_sensitivity(self, boundary):
+        """``{parameter: gradient}`` of the equilibrium just after ``boundary``
+        for that boundary's own sliders."""
+        return {parameter: self.gradient(boundary + 1, parameter)
+                for parameter in self.parameters if parameter[1] == boundary}
+
+
+def sensitivity_parameters(config):
+    """The rate constants and every slider that is active in ``config``."""
+    reaction = config["selected_reaction"]
+    parameters = list(RATE_PARAMETERS)
+    for boundary, change in enumerate(config["phase_changes"]):
+        if change == "Temperature":
+            parameters.append(("temp_effects", boundary))
+        elif change == "Volume/Pressure":
+            parameters.append(("vol_effects", boundary))
+        elif change == "Addition":
+            parameters += [(f"{species}_perturb_list", boundary)
+                           for species, key in zip(SPECIES, "abcd") if reaction[key] != 0]
+    return parameters
+
+
+def equilibrium_sensitivity(y0, k1, k2, stoich, dy0, dk1, dk2):
+    """Equilibrium reached from ``y0`` and its (4, P) gradient, given the
+    gradients of ``y0`` (4, P), ``k1`` and ``k2`` (P,) to the same P parameters."""
+    rhs, jac = build_rate_functions(*stoich)
+    nu = np.array([-stoich[0], -stoich[1], stoich[2], stoich[3]], dtype=float)
+    y = solve_equilibrium(y0, k1, k2, stoich)
+    # rhs and jac are nu * r and outer(nu, ∇r); read r's terms off the
+    # component with the largest |nu|.
+    i = np.argmax(np.abs(nu))
+    gradient = jac(0.0, y, k1, k2)[i] / nu[i]
+    slope = gradient @ nu
+    if slope >= 0:
+        return y, _secant_sensitivity(y0, y, k1, k2, stoich, dy0, dk1, dk2)
+    dg = gradient @ dy0 + rhs(0.0, y, 1.0, 0.0)[i] / nu[i] * dk1 + rhs(0.0, y, 0.0, 1.0)[i] / nu[i] * dk2
+    return y, dy0 + np.outer(nu, -dg / slope)
+
+
+def _secant_sensitivity(y0, y, k1, k2, stoich, dy0, dk1, dk2):
+    # Nothing pulls the state back when k1 or k2 is 0 (the reaction runs to
+    # completion) or when a reactant and a product are both used up. The
+    # equilibrium is not differentiable there: it has kinks where the
+    # limiting species changes, and for orders above one an infinite slope.
+    # The sliders that lead there are at the end of their range and can only
+    # grow, so a one-sided secant over SECANT_STEP along each parameter's
+    # direction stands in for its slope.
+    sensitivity = np.empty_like(dy0)
+    for j in range(dy0.shape[1]):
+        nudged = solve_equilibrium(y0 + SECANT_STEP * dy0[:, j], k1 + SECANT_STEP * dk1[j],
+                                   k2 + SECANT_STEP * dk2[j], stoich)
+        sensitivity[:, j] = (nudged - y) / SECANT_STEP
+    return sensitivity
+
+
+def run_sensitivities(config):
+    """Equilibrium states of ``config`` and their gradients, without the cache."""
+    reaction = config["selected_reaction"]
+    stoich = (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+    parameters = sensitivity_parameters(config)
+    column = {parameter: j for j, parameter in enumerate(parameters)}
+    n_phases = len(config["phase_changes"]) + 1
+
+    y = np.array(INIT_STATE, dtype=float)
+    dy = np.zeros((4, len(parameters)))
+    k1, k2 = K1_BASE, K2_BASE
+    dk1 = np.zeros(len(parameters))
+    dk2 = np.zeros(len(parameters))
+    dk1[column["k1", None]] = 1.0
+    dk2[column["k2", None]] = 1.0
+    ends, gradients = [], []
+    with timed("sensitivities"):
+        for i in range(n_phases):
+            y, dy = equilibrium_sensitivity(y, k1, k2, stoich, dy, dk1, dk2)
+            ends.append(y)
+            gradients.append(dy)
+            if i == n_phases - 1:
+                break
+            # The boundary rules of ``engine.apply_boundary``, differentiated.
+            change = config["phase_changes"][i]
+            if change == "Temperature":
+                effect = config["temp_effects"][i]
+                j = column["temp_effects", i]
+                if reaction["delta_H"] < 0:
+                    k2 = K2_BASE * (1 + effect)
+                    dk2 = np.zeros(len(parameters))
+                    dk2[column["k2", None]] = 1 + effect
+                    dk2[j] = K2_BASE
+                else:
+                    k1 = K1_BASE * (1 + effect)
+                    dk1 = np.zeros(len(parameters))
+                    dk1[column["k1", None]] = 1 + effect
+                    dk1[j] = K1_BASE
+            elif change == "Volume/Pressure":
+                factor = 1 + config["vol_effects"][i]
+                dy = dy / factor
+                dy[:, column["vol_effects", i]] -= y / factor ** 2
+                y = y / factor
+            elif change == "Addition":
+                dy = dy.copy()
+                y = y.copy()
+                for s, species in enumerate(SPECIES):
+                    factor = 1 + config[f"{species}_perturb_list"][i]
+                    dy[s] *= factor
+                    if (f"{species}_perturb_list", i) in column:
+                        dy[s, column[f"{species}_perturb_list", i]] += y[s]
+                    y[s] *= factor
+    return SensitivityResult(config_key(config, model="sensitivity"), parameters, np.array(ends),
+                             np.array(gradients))
+
+
+def simulate_sensitivities(config):
+    """The (possibly cached) ``run_sensitivities`` result."""
+    return result_cache.get_or_compute(config_key(config, model="sensitivity"),
+                                       lambda: run_sensitivities(config))
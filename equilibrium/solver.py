@@ -0,0 +1,125 @@
+"""Per-stoichiometry rate laws with analytic Jacobians and a choice of backends.
+
+``odeint`` without a Jacobian falls back to finite differences, which costs
+four extra rate evaluations per Jacobian for our four species. Here the rate
+function and its Jacobian are generated once per ``(a, b, c, d)`` tuple with
+the powers written out as plain multiplications, e.g. for the Haber process::
+
+    r = k1*A*B*B*B - k2*C*C
+"""
+
+import functools
+
+import numpy as np
+from scipy.integrate import odeint, solve_ivp
+
+BACKENDS = ["odeint", "LSODA", "BDF", "Radau"]
+
+# The tolerances ``odeint`` uses when none are given, so the default backend
+# reproduces the original page output.
+DEFAULT_RTOL = 1.49012e-8
+DEFAULT_ATOL = 1.49012e-8
+
+# Concentrations may dip a little below zero inside the error tolerance; more
+# than this means the solver has lost accuracy.
+NEGATIVE_TOLERANCE = 1e-6
+
+_NAMES = ("A", "B", "C", "D")
+
+
+class SolverError(RuntimeError):
+    """Raised when an integration fails or returns an unphysical result."""
+
+
+def _monomial(names, orders):
+    factors = []
+    for name, order in zip(names, orders):
+        factors.extend([name] * order)
+    return "*".join(factors) or "1.0"
+
+
+def _monomial_derivative(names, orders, index):
+    # d/dX of X**n * (others) == n * X**(n-1) * (others)
+    if orders[index] == 0:
+        return None
+    reduced = list(orders)
+    reduced[index] -= 1
+    term = _monomial(names, reduced)
+    return term if orders[index] == 1 else f"{orders[index]}*{term}"
+
+
+@functools.lru_cache(maxsize=None)
+def build_rate_functions(a, b, c, d):
+    """Return ``(rhs, jac)`` specialised for ``aA + bB ⇌ cC + dD``.
+
+    Both take ``(t, y, k1, k2)``; ``rhs`` returns dy/dt and ``jac`` the 4x4
+    matrix d(dy/dt)/dy.
+    """
+    forward = _monomial(_NAMES[:2], (a, b))
+    reverse = _monomial(_NAMES[2:], (c, d))
+    gradient = []
+    for index in range(4):
+        if index < 2:
+            term = _monomial_derivative(_NAMES[:2], (a, b), index)
+            gradient.append(f"k1*{term}" if term else "0.0")
+        else:
+            term = _monomial_derivative(_NAMES[2:], (c, d), index - 2)
+            gradient.append(f"-k2*{term}" if term else "0.0")
+
+    source = (
+        "def rhs(t, y, k1, k2):\n"
+        "    A, B, C, D = y\n"
+        f"    r = k1*{forward} - k2*{reverse}\n"
+        "    return nu * r\n"
+        "\n"
+        "def jac(t, y, k1, k2):\n"
+        "    A, B, C, D = y\n"
+        f"    return np.outer(nu, ({', '.join(gradient)}))\n"
+    )
+    namespace = {"np": np, "nu": np.array([-a, -b, c, d], dtype=float)}
+    exec(compile(source, f"<rate law {a},{b},{c},{d}>", "exec"), namespace)
+    return namespace["rhs"], namespace["jac"]
+
+
+def integrate_phase(y0, t_eval, k1, k2, stoich, method="odeint",
+                    rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """Integrate one phase and return ``(sol, stats)``.
+
+    ``sol`` has one row per point of ``t_eval``. ``stats`` records the backend
+    and how many rate (``nfev``) and Jacobian (``njev``) evaluations it took.
+    """
+    rhs, jac = build_rate_functions(*stoich)
+    if method == "odeint":
+        sol, info = odeint(rhs, y0, t_eval, args=(k1, k2), Dfun=jac, tfirst=True,
+                           rtol=rtol, atol=atol, full_output=True)
+        success = info["message"] == "Integration successful."
+        stats = {
+            "backend": method,
+            "nfev": int(info["nfe"][-1]),
+            "njev": int(info["nje"][-1]),
+            "message": info["message"],
+        }
+    elif method in BACKENDS:
+        out = solve_ivp(rhs, (t_eval[0], t_eval[-1]), y0, method=method, t_eval=t_eval,
+                        args=(k1, k2), jac=jac, rtol=rtol, atol=atol)
+        sol = out.y.T
+        success = out.success
+        stats = {
+            "backend": method,
+            "nfev": int(out.nfev),
+            "njev": int(out.njev),
+            "message": out.message,
+        }
+    else:
+        raise ValueError(f"Unknown solver backend {method!r}; choose one of {BACKENDS}.")
+
+    if not success:
+        raise SolverError(f"{method} failed: {stats['message']}")
+    if not np.all(np.isfinite(sol)):
+        raise SolverError(f"{method} returned non-finite concentrations.")
+    if sol.min() < -NEGATIVE_TOLERANCE:
+        raise SolverError(
+            f"{method} returned a negative concentration ({sol.min():.3g}); "
+            "try a tighter tolerance or a stiff backend."
+        )
+    return sol, stats
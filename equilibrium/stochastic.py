@@ -0,0 +1,219 @@
+"""Stochastic simulation of ``aA + bB ⇌ cC + dD`` with whole ensembles at once.
+
+Concentrations become molecule counts ``X = concentration * omega``, where
+``omega`` is the number of molecules per unit concentration (the system
+size). Each reaction event fires with the mass-action propensity
+
+    h_forward = k1 * omega * prod(X_i (X_i - 1) ... (X_i - a_i + 1) / omega**a_i)
+
+(and likewise for the reverse), which tends to the ODE rate law as omega
+grows. The boundary rules are those of ``engine.apply_boundary`` on counts:
+
+* Temperature scales k1 or k2 exactly as in the deterministic model.
+* Volume/Pressure scales the volume, so ``omega`` grows by ``1 + effect``
+  while the counts stay the same.
+* Addition multiplies each count by ``1 + perturb`` (rounded).
+
+``ssa`` runs Gillespie's exact algorithm. Every trajectory of the ensemble
+draws its next event in the same NumPy step, so a step costs the same for
+one trajectory as for hundreds. ``tau`` (tau-leaping) fires a Poisson number
+of events per reaction per time step, which is what keeps large systems
+fast. ``auto`` uses SSA while a phase is expected to need at most
+``SSA_MAX_EVENTS`` events per trajectory.
+
+The result has the ensemble mean as ``sols``, so it plots like a
+``SimulationResult``, plus percentile ``bands``.
+"""
+
+import numpy as np
+
+from equilibrium.cache import config_key
+from equilibrium.engine import SimulationResult, result_cache
+from equilibrium.metrics import increment, timed
+from equilibrium.reactions import INIT_STATE, K1_BASE, K2_BASE, PHASE_DURATION
+from equilibrium.sampling import phase_time_grid
+
+STOCHASTIC_METHODS = ["auto", "ssa", "tau"]
+METHOD_NAMES = {"ssa": "exact SSA", "tau": "tau-leaping"}
+OMEGA_CHOICES = [10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+DEFAULT_OMEGA = 100
+DEFAULT_ENSEMBLE = 200
+MAX_ENSEMBLE = 1000
+# Output samples per phase; noise needs far fewer points than a smooth curve.
+STOCHASTIC_SAMPLES = 200
+# (lower, upper) percentiles, widest first.
+BANDS = ((5, 95), (25, 75))
+SSA_MAX_EVENTS = 2000
+# Tau-leaping steps are short enough that one step changes a typical count by
+# at most about this fraction of omega.
+TAU_EPSILON = 0.03
+
+
+class StochasticResult(SimulationResult):
+    """Ensemble mean trajectories (``sols``) and percentile ``bands``.
+
+    ``bands`` maps each ``(lower, upper)`` percentile pair to two lists with
+    one (samples, 4) array per phase.
+    """
+
+    def __init__(self, key, t_phases, sols, bands, stats=None):
+        super().__init__(key, t_phases, sols, stats)
+        self.bands = bands
+        for lower, upper in bands.values():
+            for array in lower + upper:
+                array.flags.writeable = False
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        for lower, upper in self.bands.values():
+            for array in lower + upper:
+                array.flags.writeable = False
+
+    @property
+    def nbytes(self):
+        return super().nbytes + sum(array.nbytes for lower, upper in self.bands.values()
+                                    for array in lower + upper)
+
+
+def _falling_power(counts, order, omega):
+    # X (X - 1) ... (X - order + 1) / omega**order, zero once X < order.
+    value = np.ones(len(counts))
+    for j in range(order):
+        value *= np.maximum(counts - j, 0) / omega
+    return value
+
+
+def propensities(x, omega, k1, k2, stoich):
+    """(N, 2) forward and reverse propensities for the (N, 4) counts ``x``."""
+    a, b, c, d = stoich
+    forward = k1 * omega * _falling_power(x[:, 0], a, omega) * _falling_power(x[:, 1], b, omega)
+    reverse = k2 * omega * _falling_power(x[:, 2], c, omega) * _falling_power(x[:, 3], d, omega)
+    return np.column_stack([forward, reverse])
+
+
+def _ssa_phase(x, omega, k1, k2, stoich, t_grid, rng):
+    """Exact SSA for every row of ``x`` over ``t_grid``; returns (samples, N, 4) counts."""
+    nu = np.array([-stoich[0], -stoich[1], stoich[2], stoich[3]])
+    n, samples = len(x), len(t_grid)
+    out = np.empty((samples, n, 4))
+    t = np.full(n, t_grid[0])
+    recorded = np.zeros(n, dtype=int)
+    rows = np.arange(n)
+    events = 0
+    while True:
+        h = propensities(x, omega, k1, k2, stoich)
+        total = h.sum(axis=1)
+        with np.errstate(divide="ignore"):
+            t_next = t + rng.exponential(size=n) / total
+        # Every sample time before the next event sees the current state.
+        reached = np.searchsorted(t_grid, t_next, side="left")
+        count = reached - recorded
+        if count.any():
+            row_index = np.repeat(rows, count)
+            offsets = np.arange(len(row_index)) - np.repeat(np.cumsum(count) - count, count)
+            out[recorded[row_index] + offsets, row_index] = x[row_index]
+            recorded = reached
+        running = recorded < samples
+        if not running.any():
+            return out, events
+        forward = rng.random(n) * total < h[:, 0]
+        direction = np.where(forward, 1, -1) * running
+        x = x + direction[:, None] * nu
+        t = t_next
+        events += 1
+
+
+def _tau_phase(x, omega, k1, k2, stoich, t_grid, rng):
+    """Tau-leaping for every row of ``x`` over ``t_grid``; returns (samples, N, 4) counts."""
+    a, b, c, d = stoich
+    nu = np.array([-a, -b, c, d])
+    out = np.empty((len(t_grid), len(x), 4))
+    out[0] = x
+    gap = t_grid[1] - t_grid[0]
+    # Substeps per sample, from the largest rate at the start of the phase.
+    largest = np.abs(propensities(x, omega, k1, k2, stoich)).max(initial=0.0) * max(stoich)
+    substeps = max(1, int(np.ceil(largest * gap / (TAU_EPSILON * omega))))
+    tau = gap / substeps
+    steps = 0
+    for s in range(1, len(t_grid)):
+        for _ in range(substeps):
+            fired = rng.poisson(propensities(x, omega, k1, k2, stoich) * tau)
+            # Never consume more molecules than there are.
+            limit = np.min([x[:, i] // order for i, order in ((0, a), (1, b)) if order], axis=0)
+            forward = np.minimum(fired[:, 0], limit)
+            x = x + forward[:, None] * nu
+            limit = np.min([x[:, i] // order for i, order in ((2, c), (3, d)) if order], axis=0)
+            reverse = np.minimum(fired[:, 1], limit)
+            x = x - reverse[:, None] * nu
+            steps += 1
+        out[s] = x
+    return out, steps
+
+
+def _apply_boundary(x, omega, k1, k2, config, i):
+    change = config["phase_changes"][i]
+    if change == "Temperature":
+        effect = config["temp_effects"][i]
+        if config["selected_reaction"]["delta_H"] < 0:
+            k2 = K2_BASE * (1 + effect)
+        else:
+            k1 = K1_BASE * (1 + effect)
+    elif change == "Volume/Pressure":
+        omega = omega * (1 + config["vol_effects"][i])
+    elif change == "Addition":
+        factors = np.array([1 + config[f"{species}_perturb_list"][i] for species in "ABCD"])
+        x = np.rint(x * factors).astype(x.dtype)
+    return x, omega, k1, k2
+
+
+def choose_method(x, omega, k1, k2, stoich, method="auto"):
+    """``ssa`` or ``tau`` for a phase starting from the counts ``x``."""
+    if method != "auto":
+        return method
+    expected = propensities(x, omega, k1, k2, stoich).sum(axis=1).mean() * PHASE_DURATION
+    return "ssa" if expected <= SSA_MAX_EVENTS else "tau"
+
+
+def run_stochastic(config, omega=DEFAULT_OMEGA, ensemble=DEFAULT_ENSEMBLE, method="auto",
+                   samples=STOCHASTIC_SAMPLES, seed=0):
+    """Simulate ``ensemble`` trajectories of ``config`` without the result cache."""
+    if method not in STOCHASTIC_METHODS:
+        raise ValueError(f"Unknown stochastic method {method!r}; choose one of {STOCHASTIC_METHODS}.")
+    key = config_key(config, model="stochastic", omega=omega, ensemble=ensemble, method=method,
+                     samples=samples, seed=seed)
+    reaction = config["selected_reaction"]
+    stoich = (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+    rng = np.random.default_rng(seed)
+    x = np.tile(np.rint(np.array(INIT_STATE) * omega).astype(np.int64), (ensemble, 1))
+    k1, k2 = K1_BASE, K2_BASE
+    n_phases = len(config["phase_changes"]) + 1
+    t_phases, means, stats = [], [], []
+    bands = {band: ([], []) for band in BANDS}
+    for i in range(n_phases):
+        t_grid = phase_time_grid(i, samples)
+        backend = choose_method(x, omega, k1, k2, stoich, method)
+        with timed("stochastic_phase", backend=backend):
+            phase = _ssa_phase if backend == "ssa" else _tau_phase
+            counts, steps = phase(x, omega, k1, k2, stoich, t_grid, rng)
+        increment("stochastic_steps_total", steps, backend=backend)
+        concentrations = counts / omega
+        t_phases.append(t_grid)
+        means.append(concentrations.mean(axis=1))
+        percentiles = np.percentile(concentrations, [p for band in BANDS for p in band], axis=1)
+        for j, band in enumerate(BANDS):
+            bands[band][0].append(percentiles[2 * j])
+            bands[band][1].append(percentiles[2 * j + 1])
+        stats.append({"backend": backend, "steps": steps, "omega": omega})
+        x = counts[-1].astype(np.int64)
+        if i < n_phases - 1:
+            x, omega, k1, k2 = _apply_boundary(x, omega, k1, k2, config, i)
+    return StochasticResult(key, t_phases, means, bands, stats)
+
+
+def simulate_stochastic(config, omega=DEFAULT_OMEGA, ensemble=DEFAULT_ENSEMBLE, method="auto",
+                        samples=STOCHASTIC_SAMPLES, seed=0):
+    """The (possibly cached) ``run_stochastic`` result; the same seed gives the same ensemble."""
+    options = dict(omega=omega, ensemble=ensemble, method=method, samples=samples, seed=seed)
+    return result_cache.get_or_compute(
+        config_key(config, model="stochastic", **options), lambda: run_stochastic(config, **options)
+    )
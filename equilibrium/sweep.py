@@ -0,0 +1,129 @@
+"""Equilibrium concentrations over a grid of one or two boundary settings.
+
+A sweep takes a saved config and replaces one or two of its slider values
+(a temperature, volume/pressure or perturbation effect at some boundary)
+with every value on a grid. Each cell is the config with those values, and
+its phases are assumed to settle, so the cell's result is the chain of
+steady states from ``batch.equilibrium_states_batch``. All uncached cells of
+a chunk go through one vectorised solve. A 100x100 grid therefore costs a
+few dozen array operations per phase rather than 10,000 simulations.
+
+Cells are cached by their values, so refining a grid (21 -> 41 points on the
+same range) only computes the new cells.
+"""
+
+import os
+
+import numpy as np
+
+from equilibrium.batch import configs_to_batch, equilibrium_states_batch
+from equilibrium.cache import ResultCache, config_key
+from equilibrium.reactions import CHANGE_TYPES, PERTURB_RANGE, SPECIES, TEMP_EFFECT_RANGE, VOL_EFFECT_RANGE
+
+# The config field each sweepable slider lives in, the change type its
+# boundary must have, its label and its range on the setup page.
+SWEEP_FIELDS = {
+    "temp_effects": {"change": "Temperature", "label": "Temperature effect", "range": TEMP_EFFECT_RANGE},
+    "vol_effects": {"change": "Volume/Pressure", "label": "Volume/Pressure effect", "range": VOL_EFFECT_RANGE},
+}
+for _species in SPECIES:
+    SWEEP_FIELDS[f"{_species}_perturb_list"] = {
+        "change": "Addition", "label": f"{_species} perturbation", "range": PERTURB_RANGE,
+    }
+DEFAULT_RESOLUTION = 41
+MAX_RESOLUTION = 100
+# Grid values are rounded to this many decimals in the cell keys, so the
+# same point of two linspace grids maps to the same cell.
+KEY_DECIMALS = 10
+
+sweep_cache = ResultCache(
+    max_bytes=int(float(os.environ.get("EQUILIBRIUM_SWEEP_CACHE_MB", "32")) * 1024 * 1024)
+)
+
+
+def sweep_parameters(config):
+    """Every ``(field, boundary)`` the page can sweep for ``config``."""
+    reaction = config["selected_reaction"]
+    parameters = []
+    for boundary in range(len(config["phase_changes"])):
+        parameters += [("temp_effects", boundary), ("vol_effects", boundary)]
+        parameters += [(f"{species}_perturb_list", boundary)
+                       for species, key in zip(SPECIES, "abcd") if reaction[key] != 0]
+    return parameters
+
+
+def parameter_label(parameter):
+    field, boundary = parameter
+    return f"Boundary {boundary + 1}: {SWEEP_FIELDS[field]['label']}"
+
+
+def compatible(first, second):
+    """Whether two parameters can be swept together (one change type per boundary)."""
+    if first == second:
+        return False
+    if first[1] != second[1]:
+        return True
+    return SWEEP_FIELDS[first[0]]["change"] == SWEEP_FIELDS[second[0]]["change"]
+
+
+def sweep_axis(parameter, resolution=DEFAULT_RESOLUTION):
+    low, high = SWEEP_FIELDS[parameter[0]]["range"]
+    return np.linspace(low, high, resolution)
+
+
+def sweep_batch(config, parameters, columns):
+    """``configs_to_batch`` arrays for ``config`` repeated once per row of
+    ``columns`` (one array of values per parameter), with those values set
+    and each swept boundary switched to the parameter's change type."""
+    n = len(columns[0])
+    batch = {name: np.repeat(array, n, axis=0) for name, array in configs_to_batch([config]).items()}
+    for (field, boundary), values in zip(parameters, columns):
+        batch["changes"][:, boundary] = CHANGE_TYPES.index(SWEEP_FIELDS[field]["change"])
+        if field in ("temp_effects", "vol_effects"):
+            batch[field][:, boundary] = values
+        else:
+            batch["perturbs"][:, boundary, SPECIES.index(field[0])] = values
+    return batch
+
+
+def iter_sweep(config, parameters, axes, chunk_size=1000):
+    """Solve every cell of the grid spanned by ``axes``, a chunk at a time.
+
+    ``parameters`` and ``axes`` give one parameter and one array of values per
+    grid dimension. Yields ``(indices, ends)``: flat (C-order) indices into the
+    grid and the (len(indices), phases, 4) steady states of those cells. Cached
+    cells come first, in one chunk.
+    """
+    parameters = [tuple(parameter) for parameter in parameters]
+    if len(parameters) == 2 and not compatible(*parameters):
+        raise ValueError("These parameters need different change types at the same boundary.")
+    for _, boundary in parameters:
+        if not 0 <= boundary < len(config["phase_changes"]):
+            raise ValueError(f"Config has no boundary {boundary + 1}.")
+    base = (config_key(config), tuple(parameters))
+    mesh = np.meshgrid(*axes, indexing="ij")
+    cells = np.column_stack([values.ravel() for values in mesh])
+    keys = [(base, tuple(np.round(cell, KEY_DECIMALS).tolist())) for cell in cells]
+
+    cached = [(index, sweep_cache.get(key)) for index, key in enumerate(keys)]
+    hits = [(index, ends) for index, ends in cached if ends is not None]
+    if hits:
+        yield np.array([index for index, _ in hits]), np.stack([ends for _, ends in hits])
+    missing = np.array([index for index, ends in cached if ends is None], dtype=int)
+    for start in range(0, len(missing), chunk_size):
+        indices = missing[start:start + chunk_size]
+        batch = sweep_batch(config, parameters, [cells[indices, d] for d in range(len(parameters))])
+        _, ends = equilibrium_states_batch(**batch)
+        for index, cell_ends in zip(indices, ends):
+            cell_ends.flags.writeable = False
+            sweep_cache.put(keys[index], cell_ends)
+        yield indices, ends
+
+
+def run_sweep(config, parameters, axes):
+    """The steady states of every cell, shaped (*grid shape, phases, 4)."""
+    shape = tuple(len(values) for values in axes)
+    result = np.empty((int(np.prod(shape)), len(config["phase_changes"]) + 1, 4))
+    for indices, ends in iter_sweep(config, parameters, axes):
+        result[indices] = ends
+    return result.reshape(shape + result.shape[1:])
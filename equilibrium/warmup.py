@@ -0,0 +1,175 @@
+"""Warm the process up before the first student needs a graph.
+
+Importing scipy, matplotlib and Altair and building matplotlib's font cache
+take seconds in a fresh server process. ``start_warm_up`` (called by the
+setup page) does all of that in a background thread. It also simulates (in
+the worker pool, like the pages) and renders the config the setup page saves
+by default for every preset, so the first Simulation and MCQ visits are
+served from the caches.
+
+``start_precompute`` does the same for the config a student has just saved.
+It simulates the config and every config one slider step away from it, which
+is where the next save usually lands. Only each session's newest request is
+kept, so a student who keeps saving never waits behind configs they have
+already left. Sessions take turns in the order they asked.
+
+Set ``EQUILIBRIUM_WARMUP=0`` to turn both off.
+"""
+
+import importlib
+import os
+import threading
+from collections import OrderedDict
+
+from equilibrium.metrics import increment, timed
+from equilibrium.reactions import (
+    PERTURB_RANGE, SLIDER_STEP, SPECIES, TEMP_EFFECT_RANGE, VOL_EFFECT_RANGE, default_config, reaction_options,
+)
+
+PRELOAD_MODULES = [
+    "numpy",
+    "scipy.integrate",
+    "scipy.optimize",
+    "matplotlib.figure",
+    "matplotlib.backends.backend_agg",
+    "pandas",
+    "altair",
+    # Streamlit serializes chart data with Arrow.
+    "pyarrow",
+]
+
+_lock = threading.Lock()
+_thread = None
+
+_precompute_ready = threading.Condition()
+# Session id -> the newest config it asked for, oldest request first.
+_precompute_requests = OrderedDict()
+_precompute_thread = None
+
+
+def preload_modules():
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def warm_preset(reaction_choice):
+    """Fill the caches for the default config of one preset, as both pages show it."""
+    from equilibrium.charts import trajectory_chart
+    from equilibrium.quiz import quiz_visibility
+    from equilibrium.render import all_visible, plot_title, render_result
+    from equilibrium.sampling import ADAPTIVE_SAMPLES
+    from equilibrium.workers import simulate
+
+    config = default_config(reaction_choice)
+    reaction = config["selected_reaction"]
+    stoich = (reaction["a"], reaction["b"], reaction["c"], reaction["d"])
+    title = plot_title(reaction_choice, reaction["delta_H"])
+    result = simulate(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+    n_phases = len(result.sols)
+    trajectory_chart(result, stoich, title)
+    render_result(result, all_visible(n_phases, stoich), title)
+    for hidden in range(n_phases - 1):
+        render_result(result, quiz_visibility(stoich, n_phases, hidden), title)
+
+
+def warm_up(presets=None):
+    from equilibrium.workers import PoolBusy, SimulationTimeout, WorkerError, pool
+
+    with timed("warm_up"):
+        # The simulation workers import the engine while this process does.
+        pool.start()
+        preload_modules()
+        for reaction_choice in presets or reaction_options:
+            try:
+                warm_preset(reaction_choice)
+            except PoolBusy:
+                break  # students are already here
+            except (SimulationTimeout, WorkerError):
+                continue
+
+
+def start_warm_up():
+    """Run ``warm_up`` in a daemon thread, once per process. Returns the thread."""
+    global _thread
+    if os.environ.get("EQUILIBRIUM_WARMUP") == "0":
+        return None
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warm_up, name="equilibrium-warm-up", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def neighbour_configs(config, step=SLIDER_STEP):
+    """Copies of ``config`` with one of its shown sliders moved ``step`` either way."""
+    reaction = config["selected_reaction"]
+    for i, change in enumerate(config["phase_changes"]):
+        if change == "Temperature":
+            sliders = [("temp_effects", TEMP_EFFECT_RANGE)]
+        elif change == "Volume/Pressure":
+            sliders = [("vol_effects", VOL_EFFECT_RANGE)]
+        else:
+            sliders = [(f"{species}_perturb_list", PERTURB_RANGE)
+                       for species, key in zip(SPECIES, "abcd") if reaction[key] != 0]
+        for field, (low, high) in sliders:
+            for delta in (-step, step):
+                value = round(config[field][i] + delta, 2)
+                if low <= value <= high:
+                    neighbour = dict(config, **{field: list(config[field])})
+                    neighbour[field][i] = value
+                    yield neighbour
+
+
+def _precompute_loop():
+    from equilibrium.sampling import ADAPTIVE_SAMPLES
+    from equilibrium.workers import PoolBusy, SimulationTimeout, WorkerError, simulate
+
+    while True:
+        with _precompute_ready:
+            while not _precompute_requests:
+                _precompute_ready.wait()
+            session, config = _precompute_requests.popitem(last=False)
+        with timed("precompute"):
+            for candidate in [config, *neighbour_configs(config)]:
+                if session in _precompute_requests:
+                    break  # the student has moved on
+                # The same call as the Simulation and MCQ pages.
+                try:
+                    simulate(candidate, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+                except PoolBusy:
+                    break  # speculative work gives way to real requests
+                except (SimulationTimeout, WorkerError):
+                    continue
+                increment("precomputed_configs_total")
+
+
+def _session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def start_precompute(config, session=None):
+    """Simulate ``config`` and its ``neighbour_configs`` in a background thread.
+
+    Replaces the request of the same ``session`` (default: the current
+    Streamlit session) if it has not finished yet. Returns the thread.
+    """
+    global _precompute_thread
+    if os.environ.get("EQUILIBRIUM_WARMUP") == "0":
+        return None
+    if session is None:
+        session = _session_id()
+    with _precompute_ready:
+        _precompute_requests.pop(session, None)
+        _precompute_requests[session] = config
+        if _precompute_thread is None:
+            _precompute_thread = threading.Thread(target=_precompute_loop, name="equilibrium-precompute",
+                                                  daemon=True)
+            _precompute_thread.start()
+        _precompute_ready.notify()
+    return _precompute_thread
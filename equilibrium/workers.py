@@ -0,0 +1,333 @@
+"""A process pool that runs simulations off the Streamlit script threads.
+
+``odeint`` calls back into Python thousands of times per phase and holds the
+GIL meanwhile, so a simulation on a session's script thread stalls every
+other session of the server process. ``simulate`` here has the signature of
+``engine.simulate`` but runs cache misses in worker processes shared by all
+sessions:
+
+* Identical configs in flight share one job (coalescing), whichever
+  sessions asked for them.
+* At most ``EQUILIBRIUM_WORKER_QUEUE`` jobs wait for a worker. Beyond that,
+  ``submit`` raises ``PoolBusy`` rather than queueing without limit.
+* A job that runs longer than ``EQUILIBRIUM_WORKER_TIMEOUT`` seconds fails
+  with ``SimulationTimeout`` and its worker is killed and replaced.
+* ``simulate`` waits at most ``EQUILIBRIUM_WORKER_WAIT`` seconds for its job,
+  queueing included, and then raises ``SimulationTimeout``. The job itself
+  carries on and its result lands in the cache for the next request.
+
+Results go into ``engine.result_cache`` of the server process, so later
+requests never leave it. Phases stay reusable across workers too: every job
+carries the phases the server's ``engine.phase_cache`` already holds for its
+config, and the worker sends back the phases it integrated, which go into
+that cache. Editing boundary k therefore re-integrates only the phases after
+it, whichever worker takes the job.
+
+The workers are plain ``python -m equilibrium.workers`` subprocesses that
+exchange pickled jobs and results over pipes. ``multiprocessing`` cannot be
+used here: its ``spawn`` start method re-runs the ``__main__`` module in
+every child, and while a page runs, Streamlit makes that the page script.
+``fork`` is unsafe in the threaded server. ``EQUILIBRIUM_WORKERS=0`` runs
+every simulation inline instead.
+
+``simulate_stochastic`` and ``simulate_sensitivities`` do the same for
+``stochastic.simulate_stochastic`` and ``sensitivity.simulate_sensitivities``;
+their jobs carry ``model="stochastic"`` or ``model="sensitivity"`` in their
+options. ``simulate(..., store=False)`` runs a job without caching its
+result, for bulk exports.
+
+The metrics a job records in its worker (solver timings and evaluation
+counts) come back with its result. They go into the server's
+``metrics.registry`` once per job, and into the trace of every page run
+that waited for it.
+"""
+
+import atexit
+import os
+import queue
+import subprocess
+import sys
+import threading
+import traceback
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing.connection import Connection
+
+from equilibrium.cache import config_key
+from equilibrium.metrics import add_to_trace, increment, observe, record, start_trace, stop_trace
+from equilibrium.reactions import PHASE_SAMPLES
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORKERS = int(os.environ.get("EQUILIBRIUM_WORKERS", os.cpu_count() or 1))
+DEFAULT_QUEUE = int(os.environ.get("EQUILIBRIUM_WORKER_QUEUE", "64"))
+DEFAULT_TIMEOUT = float(os.environ.get("EQUILIBRIUM_WORKER_TIMEOUT", "60"))
+DEFAULT_WAIT = float(os.environ.get("EQUILIBRIUM_WORKER_WAIT", str(DEFAULT_TIMEOUT)))
+
+
+class PoolBusy(RuntimeError):
+    """The job queue is full; the caller should try again later."""
+
+
+class SimulationTimeout(TimeoutError):
+    """A job ran longer than the pool's timeout."""
+
+
+class WorkerError(RuntimeError):
+    """A job raised in its worker, or the worker died."""
+
+
+class _Worker:
+    """One worker subprocess and the two pipes to it."""
+
+    def __init__(self):
+        job_read, job_write = os.pipe()
+        result_read, result_write = os.pipe()
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "equilibrium.workers", str(job_read), str(result_write)],
+            pass_fds=(job_read, result_write), cwd=REPO_DIR, env=env, stdin=subprocess.DEVNULL,
+        )
+        os.close(job_read)
+        os.close(result_write)
+        self.jobs = Connection(job_write, readable=False)
+        self.results = Connection(result_read, writable=False)
+
+    def run(self, config, options, segments, timeout):
+        self.jobs.send((config, options, segments))
+        if not self.results.poll(timeout):
+            raise SimulationTimeout(f"Simulation did not finish within {timeout:g} s.")
+        ok, value = self.results.recv()
+        if not ok:
+            raise WorkerError(value)
+        return value
+
+    def close(self, kill=False):
+        if kill:
+            self.process.kill()
+        self.jobs.close()
+        self.results.close()
+        self.process.wait()
+
+
+class SimulationPool:
+    """Worker subprocesses fed from one bounded queue (see the module docstring)."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE, timeout=DEFAULT_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._in_flight = {}
+        # Keys of in-flight jobs whose results go into the caches.
+        self._store = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Start the workers (otherwise done by the first ``submit``)."""
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._dispatch, name=f"equilibrium-worker-{len(self._threads)}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, config, store=True, **options):
+        """A ``Future`` for ``(result, events)``: the result of
+        ``engine.run_simulation(config, **options)`` (or of the ``run_*``
+        function of ``options["model"]``) and the metrics events of the job.
+
+        Joins the job already in flight for the same config and options, if
+        any. The result is put in the caches unless every caller passed
+        ``store=False``. Raises ``PoolBusy`` when the queue is full.
+        """
+        key = config_key(config, **options)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                increment("worker_coalesced_total")
+                if store:
+                    self._store.add(key)
+                return future
+            future = Future()
+            try:
+                self._queue.put_nowait((key, config, options, future))
+            except queue.Full:
+                increment("worker_rejected_total")
+                raise PoolBusy("The server is busy with other simulations.") from None
+            self._in_flight[key] = future
+            if store:
+                self._store.add(key)
+        observe("worker_queue_depth", self._queue.qsize())
+        self.start()
+        return future
+
+    def _dispatch(self):
+        from equilibrium.engine import phase_cache, phase_keys, result_cache
+
+        worker = _Worker()
+        while True:
+            key, config, options, future = self._queue.get()
+            if key is None:
+                worker.close()
+                return
+            # The longest run of leading phases this process has cached.
+            segments = []
+            for phase_key in [] if "model" in options else phase_keys(config, **options):
+                segment = phase_cache.get(phase_key)
+                if segment is None:
+                    break
+                segments.append((phase_key, segment))
+            try:
+                result, new_segments, events = worker.run(config, options, segments, self.timeout)
+            except SimulationTimeout as error:
+                increment("worker_timeouts_total")
+                worker.close(kill=True)
+                worker = _Worker()
+                self._finish(key, future, error=error)
+            except (EOFError, OSError) as error:
+                worker.close(kill=True)
+                worker = _Worker()
+                self._finish(key, future, error=WorkerError(f"Simulation worker died: {error!r}"))
+            except WorkerError as error:
+                self._finish(key, future, error=error)
+            else:
+                record(events)
+                with self._lock:
+                    store = key in self._store
+                if store:
+                    for phase_key, segment in new_segments:
+                        phase_cache.put(phase_key, segment)
+                    result_cache.put(key, result)
+                self._finish(key, future, result=(result, events))
+
+    def _finish(self, key, future, result=None, error=None):
+        # Leave the in-flight map first, so a request arriving after a failure
+        # starts a new job instead of joining the failed one.
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self._store.discard(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def shutdown(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put((None, None, None, None))
+        for thread in threads:
+            thread.join()
+
+
+pool = SimulationPool()
+atexit.register(pool.shutdown)
+
+
+def _wait_for(config, wait, store=True, **options):
+    # The cached result, or the pool's, waiting at most ``wait`` seconds.
+    from equilibrium.engine import result_cache
+
+    result = result_cache.get(config_key(config, **options))
+    if result is None:
+        try:
+            result, events = pool.submit(config, store=store, **options).result(timeout=wait)
+        except FutureTimeout:
+            increment("worker_wait_timeouts_total")
+            raise SimulationTimeout(f"Simulation did not finish within {wait:g} s.") from None
+        add_to_trace(events)
+    return result
+
+
+def simulate(config, method="odeint", rtol=None, atol=None, mode="full", samples=PHASE_SAMPLES,
+             sampling="uniform", wait=DEFAULT_WAIT, store=True):
+    """``engine.simulate``, with cache misses run in the shared ``pool``.
+
+    Waits at most ``wait`` seconds for the result. With ``store=False`` the
+    result is not cached, like ``engine.run_simulation``. Raises
+    ``PoolBusy``, ``SimulationTimeout`` or ``WorkerError``.
+    """
+    from equilibrium.engine import run_simulation, simulate as simulate_inline
+    from equilibrium.solver import DEFAULT_ATOL, DEFAULT_RTOL
+
+    options = dict(method=method, rtol=DEFAULT_RTOL if rtol is None else rtol,
+                   atol=DEFAULT_ATOL if atol is None else atol, mode=mode, samples=samples, sampling=sampling)
+    if pool.workers == 0:
+        return simulate_inline(config, **options) if store else run_simulation(config, **options)
+    return _wait_for(config, wait, store, **options)
+
+
+def simulate_stochastic(config, omega=None, ensemble=None, method="auto", samples=None, seed=0,
+                        wait=DEFAULT_WAIT):
+    """``stochastic.simulate_stochastic``, with cache misses run in the shared ``pool``.
+
+    Raises like ``simulate``.
+    """
+    from equilibrium.stochastic import DEFAULT_ENSEMBLE, DEFAULT_OMEGA, STOCHASTIC_SAMPLES
+    from equilibrium.stochastic import simulate_stochastic as simulate_inline
+
+    options = dict(omega=DEFAULT_OMEGA if omega is None else omega,
+                   ensemble=DEFAULT_ENSEMBLE if ensemble is None else ensemble, method=method,
+                   samples=STOCHASTIC_SAMPLES if samples is None else samples, seed=seed)
+    if pool.workers == 0:
+        return simulate_inline(config, **options)
+    return _wait_for(config, wait, model="stochastic", **options)
+
+
+def simulate_sensitivities(config, wait=DEFAULT_WAIT):
+    """``sensitivity.simulate_sensitivities``, with cache misses run in the shared ``pool``.
+
+    Raises like ``simulate``.
+    """
+    from equilibrium.sensitivity import simulate_sensitivities as simulate_inline
+
+    if pool.workers == 0:
+        return simulate_inline(config)
+    return _wait_for(config, wait, model="sensitivity")
+
+
+def _run_job(config, options, segments):
+    # (result, new phase segments) for one job, inside a worker.
+    from equilibrium.engine import phase_cache, phase_keys, run_simulation
+
+    model = options.get("model")
+    if model == "stochastic":
+        from equilibrium.stochastic import run_stochastic
+
+        return run_stochastic(config, **{name: value for name, value in options.items() if name != "model"}), []
+    if model == "sensitivity":
+        from equilibrium.sensitivity import run_sensitivities
+
+        return run_sensitivities(config), []
+    for phase_key, segment in segments:
+        phase_cache.put(phase_key, segment)
+    result = run_simulation(config, **options)
+    # Only the phases the server did not send; one message keeps their
+    # arrays shared with the result's.
+    new_segments = [(phase_key, phase_cache.get(phase_key))
+                    for phase_key in phase_keys(config, **options)[len(segments):]]
+    return result, [item for item in new_segments if item[1] is not None]
+
+
+def serve(job_fd, result_fd):
+    """The worker side: run jobs from ``job_fd`` until the pool closes it."""
+    jobs = Connection(job_fd, writable=False)
+    results = Connection(result_fd, readable=False)
+    while True:
+        try:
+            config, options, segments = jobs.recv()
+        except EOFError:
+            return
+        # The job's metrics events go back with its result.
+        events = start_trace()
+        try:
+            results.send((True, (*_run_job(config, options, segments), events)))
+        except Exception:
+            results.send((False, traceback.format_exc()))
+        finally:
+            stop_trace()
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]), int(sys.argv[2]))
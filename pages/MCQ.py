@@ -1,24 +1,68 @@
 import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.integrate import odeint
 import random
 
+from equilibrium.cache import config_key
+from equilibrium.debug import debug_sidebar
+from equilibrium.metrics import start_trace, timed
+from equilibrium.quiz import boundary_answer, quiz_visibility, shift_answer
+from equilibrium.quizbank import DIFFICULTIES, open_quiz_bank
+from equilibrium.reactions import CHANGE_TYPES
+
 st.set_page_config(page_title="MCQ Quiz", page_icon="❓", layout="wide")
+start_trace()
+
+# Every piece of quiz progress; cleared together so a new quiz never grades old answers.
+QUIZ_KEYS = ["quiz_stage", "quiz1_answer", "quiz2_answer", "quiz3_answer", "quiz3_species", "quiz_boundary_index"]
+
+
+def reset_quiz(*extra_keys):
+    for key in [*QUIZ_KEYS, *extra_keys]:
+        st.session_state.pop(key, None)
+
 
 st.title("Reaction Quiz")
 st.markdown(
     "Below is a simulation plot based on your saved configuration—with one section hidden. "
-    "Then answer the two-part quiz below to test your understanding of what occurred at a randomly selected boundary."
+    "Then answer the three-part quiz below to test your understanding of what occurred at a randomly selected boundary."
 )
 
-# --- Check that configuration exists ---
-if "config" not in st.session_state:
-    st.error("No reaction configuration found. Please go to the Reaction Setup page and save a configuration.")
-    st.stop()
+# --- Quiz Source ---
+# A precomputed quiz bank (see equilibrium/quizbank.py) serves ready-made items
+# without any simulation or rendering; otherwise quiz on the saved configuration.
+bank = open_quiz_bank()
+quiz_source = "Saved Configuration"
+if bank is not None:
+    quiz_source = st.sidebar.radio("Quiz Source", ["Saved Configuration", "Quiz Bank"])
+
+bank_item = None
+if quiz_source == "Quiz Bank":
+    st.sidebar.header("Quiz Bank Filters")
+    reaction_filter = st.sidebar.selectbox("Reaction", ["Any"] + sorted(bank.index["reaction"]))
+    change_filter = st.sidebar.selectbox("Change Type", ["Any"] + CHANGE_TYPES)
+    difficulty_filter = st.sidebar.selectbox("Difficulty", ["Any"] + DIFFICULTIES)
+    candidates = bank.select(
+        reaction=None if reaction_filter == "Any" else reaction_filter,
+        change_type=None if change_filter == "Any" else change_filter,
+        difficulty=None if difficulty_filter == "Any" else difficulty_filter,
+    )
+    if not candidates:
+        st.error("No quiz bank items match these filters.")
+        st.stop()
+    if st.session_state.get("quiz_bank_item") not in candidates:
+        st.session_state.quiz_bank_item = random.choice(candidates)
+    # Answers to the previous item must not be graded against a new one.
+    quiz_subject = ("bank", st.session_state.quiz_bank_item)
+    bank_item = bank.items[st.session_state.quiz_bank_item]
+    config = bank_item["config"]
+else:
+    # --- Check that configuration exists ---
+    if "config" not in st.session_state:
+        st.error("No reaction configuration found. Please go to the Reaction Setup page and save a configuration.")
+        st.stop()
+    # Retrieve saved configuration.
+    config = st.session_state["config"]
+    quiz_subject = ("config", None)
 
-# Retrieve saved configuration.
-config = st.session_state["config"]
 reaction_choice = config["reaction_choice"]
 selected_reaction = config["selected_reaction"]
 a = selected_reaction["a"]
@@ -26,7 +70,7 @@ b = selected_reaction["b"]
 c = selected_reaction["c"]
 d = selected_reaction["d"]
 delta_H = selected_reaction["delta_H"]
-phase_changes = config["phase_changes"]   # List of 3 boundary changes.
+phase_changes = config["phase_changes"]   # One entry per boundary.
 temp_effects = config["temp_effects"]
 vol_effects = config["vol_effects"]
 A_perturb_list = config["A_perturb_list"]
@@ -36,114 +80,52 @@ D_perturb_list = config["D_perturb_list"]
 
 st.write("Reaction Selected:", reaction_choice)
 
+# A quiz belongs to the config (or bank item) it was drawn for; switching to
+# another one starts a new quiz.
+quiz_config = (*quiz_subject, config_key(config))
+if st.session_state.get("quiz_config_key") != quiz_config:
+    reset_quiz()
+    st.session_state.quiz_config_key = quiz_config
+
 # --- Choose a Random Boundary for the Quiz ---
-# We want to quiz on one of the three boundaries (index 0, 1, or 2).
-if "quiz_boundary_index" not in st.session_state:
-    st.session_state.quiz_boundary_index = random.randint(0, len(phase_changes)-1)
-quiz_boundary = st.session_state.quiz_boundary_index  # This boundary index (0-based)
-
-# --- Simulation Function for Quiz Page ---
-def generic_reaction(concentrations, t, k1, k2, a, b, c, d):
-    A, B, C, D = concentrations
-    r_forward = k1 * (A ** a) * (B ** b)
-    r_reverse = k2 * (C ** c) * (D ** d)
-    r = r_forward - r_reverse
-    return [-a * r, -b * r, c * r, d * r]
-
-def draw_connection(t_value, prev_value, next_value, color):
-    plt.vlines(t_value, prev_value, next_value, colors=color, linestyles='solid', linewidth=2)
-
-def simulate_reaction_quiz(a, b, c, d, delta_H,
-                           temp_effects, vol_effects,
-                           A_perturb_list, B_perturb_list, C_perturb_list, D_perturb_list,
-                           phase_changes, hidden_boundary_index):
-    # Base rate constants.
-    k1_base = 0.02
-    k2_base = 0.01
-    k1_current = k1_base
-    k2_current = k2_base
-    init_state = [1.0, 1.0, 0.0, 0.0]
-    
-    # There are 4 phases: Base + 3 boundaries → Phase 1, Phase 2, Phase 3, Phase 4.
-    phases = ["Phase 1"] + ["Phase 2", "Phase 3", "Phase 4"]
-    sols = []
-    t_phases = []
-    
-    # For each phase, integrate the ODE.
-    for i in range(len(phases)):
-        t_phase = np.linspace(i * 200, (i + 1) * 200, 1000)
-        sol = odeint(generic_reaction, init_state, t_phase, args=(k1_current, k2_current, a, b, c, d))
-        sols.append(sol)
-        t_phases.append(t_phase)
-        # Update state only if there is a boundary change (i < last phase).
-        if i < len(phases) - 1:
-            init_state = sol[-1].copy()
-            # The boundary change applied is from phase i to phase i+1.
-            current_boundary = phase_changes[i]
-            if current_boundary == "Temperature":
-                effect = temp_effects[i]
-                if delta_H < 0:
-                    k2_current = k2_base * (1 + effect)
-                else:
-                    k1_current = k1_base * (1 + effect)
-            elif current_boundary == "Volume/Pressure":
-                effect = vol_effects[i]
-                init_state = init_state / (1 + effect)
-            elif current_boundary == "Addition":
-                init_state[0] *= (1 + A_perturb_list[i])
-                init_state[1] *= (1 + B_perturb_list[i])
-                init_state[2] *= (1 + C_perturb_list[i])
-                init_state[3] *= (1 + D_perturb_list[i])
-                
-    # Create a plot.
-    fig = plt.figure(figsize=(10, 6))
-    # We'll use these labels for clarity.
-    for i, sol in enumerate(sols):
-        # Always plot species A, C, D.
-        if a != 0:
-            plt.plot(t_phases[i], sol[:, 0], label=f'A {phases[i]}', color='blue', linewidth=2)
-        if c != 0:
-            plt.plot(t_phases[i], sol[:, 2], label=f'C {phases[i]}', color='green', linewidth=2)
-        if d != 0:
-            plt.plot(t_phases[i], sol[:, 3], label=f'D {phases[i]}', color='purple', linewidth=2)
-        # For species B, hide the phase corresponding to the selected boundary change.
-        # The boundary change at index X affects the transition from phase (X+1) to phase (X+2).
-        # Here, we choose to hide species B in phase (hidden_boundary_index+1).
-        if b != 0:
-            if i == hidden_boundary_index + 1:
-                # Do not plot species B for this phase.
-                pass
-            else:
-                plt.plot(t_phases[i], sol[:, 1], label=f'B {phases[i]}', color='red', linewidth=2)
-                
-    # Draw connection lines between phases.
-    for i in range(len(phases)-1):
-        t_boundary = t_phases[i][-1]
-        if a != 0:
-            draw_connection(t_boundary, sols[i][-1, 0], sols[i+1][0, 0], 'blue')
-        if b != 0:
-            # Only draw connection for species B if it is not part of the hidden phase.
-            if i != hidden_boundary_index:
-                draw_connection(t_boundary, sols[i][-1, 1], sols[i+1][0, 1], 'red')
-        if c != 0:
-            draw_connection(t_boundary, sols[i][-1, 2], sols[i+1][0, 2], 'green')
-        if d != 0:
-            draw_connection(t_boundary, sols[i][-1, 3], sols[i+1][0, 3], 'purple')
-                
-    plt.xlabel("Time")
-    plt.ylabel("Concentration")
-    title_str = "{}  |  ΔH = {} kJ/mol".format(reaction_choice, delta_H)
-    plt.title(title_str)
-    plt.tight_layout()
-    return fig
-
-# Generate the simulation plot, hiding species B in the phase corresponding to our chosen boundary.
+# We want to quiz on one of the boundaries (index 0 to len(phase_changes) - 1).
+if bank_item is not None:
+    quiz_boundary = bank_item["hidden_boundary"]
+else:
+    if st.session_state.get("quiz_boundary_index", len(phase_changes)) >= len(phase_changes):
+        st.session_state.quiz_boundary_index = random.randint(0, len(phase_changes)-1)
+    quiz_boundary = st.session_state.quiz_boundary_index  # This boundary index (0-based)
+
+# Show the simulation plot, hiding species B in the phase corresponding to our chosen boundary.
 # Note: For a boundary at index X, we hide species B in phase (X+1).
-fig = simulate_reaction_quiz(a, b, c, d, delta_H,
-                             temp_effects, vol_effects,
-                             A_perturb_list, B_perturb_list, C_perturb_list, D_perturb_list,
-                             phase_changes, hidden_boundary_index=quiz_boundary)
-st.pyplot(fig)
+item_id = bank.find(config, quiz_boundary) if bank is not None else None
+if item_id is not None:
+    # Pre-rendered in the quiz bank: no integration and no rendering.
+    with timed("st_image"):
+        st.image(bank.image(item_id), width="stretch")
+else:
+    # Loaded only when the image has to be simulated and rendered here.
+    from equilibrium.render import plot_title, render_result
+    from equilibrium.sampling import ADAPTIVE_SAMPLES
+    from equilibrium.workers import PoolBusy, SimulationTimeout, WorkerError, simulate
+
+    # The trajectories come from the shared cache, so this is free if the
+    # Simulation page (or another student) has already run the same config.
+    with timed("simulate"):
+        try:
+            result = simulate(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+        except (PoolBusy, SimulationTimeout) as error:
+            st.warning(f"{error} Please reload the page in a moment.")
+            st.stop()
+        except WorkerError as error:
+            # The worker sends its whole traceback; its last line names the error.
+            st.error(f"The simulation failed: {str(error).strip().splitlines()[-1]}")
+            st.stop()
+    visibility = quiz_visibility((a, b, c, d), len(phase_changes) + 1, quiz_boundary)
+    with timed("render_result"):
+        image = render_result(result, visibility, plot_title(reaction_choice, delta_H))
+    with timed("st_image"):
+        st.image(image, width="stretch")
 
 # --- Quiz State Initialization ---
 if "quiz_stage" not in st.session_state:
@@ -152,13 +134,13 @@ if "quiz1_answer" not in st.session_state:
     st.session_state.quiz1_answer = None
 if "quiz2_answer" not in st.session_state:
     st.session_state.quiz2_answer = None
+if "quiz3_answer" not in st.session_state:
+    st.session_state.quiz3_answer = None
 
 # --- New Quiz Button ---
 if st.button("New Quiz"):
     # Remove quiz-related keys to reset.
-    for key in ["quiz_stage", "quiz1_answer", "quiz2_answer", "quiz_boundary_index"]:
-        if key in st.session_state:
-            del st.session_state[key]
+    reset_quiz("quiz_bank_item")
     st.rerun()
 
 # --- Determine the boundary label (1-indexed) for display ---
@@ -185,35 +167,58 @@ if st.session_state.quiz_stage >= 1:
     # --- Stage 2: Ask Direction of Change ---
     st.markdown("### Quiz Question - Stage 2")
     # Use the slider value for the chosen boundary.
-    if correct_q1 == "Temperature":
-        slider_val = temp_effects[quiz_boundary]
-        direction_question = f"At Boundary {quiz_boundary_label}, was the temperature increased or decreased?"
-    elif correct_q1 == "Volume/Pressure":
-        slider_val = vol_effects[quiz_boundary]
-        direction_question = f"At Boundary {quiz_boundary_label}, was the volume/pressure increased or decreased?"
-    elif correct_q1 == "Addition":
-        # For addition, check the perturbation for reagent A if available.
-        if selected_reaction["a"] != 0:
-            slider_val = A_perturb_list[quiz_boundary]
-        else:
-            slider_val = 0.0
-        direction_question = f"At Boundary {quiz_boundary_label}, did the addition indicate an increase or decrease for reagent A?"
-    else:
-        slider_val = 0.0
-        direction_question = f"What was the direction of the change at Boundary {quiz_boundary_label}?"
+    answer = boundary_answer(config, quiz_boundary)
+    slider_val = answer["slider_value"]
+    direction_question = answer["direction_question"]
     
     options2 = ["Increase", "Decrease"]
     answer2 = st.radio(direction_question, options2, key="q2")
-    if st.button("Submit Answer for Stage 2"):
+    if st.session_state.quiz_stage == 1 and st.button("Submit Answer for Stage 2"):
         st.session_state.quiz2_answer = answer2
-        # Determine correct direction based on the slider value.
-        if slider_val > 0:
-            correct_direction = "Increase"
-        elif slider_val < 0:
-            correct_direction = "Decrease"
-        else:
-            correct_direction = "No change"
-        if st.session_state.quiz2_answer == correct_direction:
-            st.success(f"Stage 2 Correct! The slider value was {slider_val:.2f}, indicating '{correct_direction}'.")
-        else:
-            st.error(f"Stage 2 Incorrect. You answered '{st.session_state.quiz2_answer}', but the correct answer is '{correct_direction}'.")
+        st.session_state.quiz_stage = 2
+
+if st.session_state.quiz_stage >= 2:
+    # Determine correct direction based on the slider value.
+    correct_direction = answer["direction"]
+    if st.session_state.quiz2_answer == correct_direction:
+        st.success(f"Stage 2 Correct! The slider value was {slider_val:.2f}, indicating '{correct_direction}'.")
+    else:
+        st.error(f"Stage 2 Incorrect. You answered '{st.session_state.quiz2_answer}', but the correct answer is '{correct_direction}'.")
+
+    # --- Stage 3: Le Chatelier shift, graded by the equilibrium's sensitivity to the slider ---
+    st.markdown("### Quiz Question - Stage 3")
+    present = [species for species, order in zip("ABCD", (a, b, c, d)) if order != 0]
+    if st.session_state.get("quiz3_species") not in present:
+        st.session_state.quiz3_species = random.choice(present)
+    shifts = bank.items[item_id].get("shifts") if item_id is not None else None
+    if shifts is not None:
+        # Precomputed in the quiz bank, like the image.
+        shift = shifts[st.session_state.quiz3_species]
+    else:
+        from equilibrium.workers import PoolBusy, SimulationTimeout, WorkerError, simulate_sensitivities
+
+        with timed("sensitivities"):
+            try:
+                sensitivities = simulate_sensitivities(config)
+            except (PoolBusy, SimulationTimeout) as error:
+                st.warning(f"{error} Please reload the page in a moment.")
+                st.stop()
+            except WorkerError as error:
+                st.error(f"The sensitivity solve failed: {str(error).strip().splitlines()[-1]}")
+                st.stop()
+        shift = shift_answer(config, quiz_boundary, st.session_state.quiz3_species, sensitivities)
+    answer3 = st.radio(shift["question"], ["Higher", "Lower", "No change"], key="q3")
+    if st.session_state.quiz_stage == 2 and st.button("Submit Answer for Stage 3"):
+        st.session_state.quiz3_answer = answer3
+        st.session_state.quiz_stage = 3
+
+if st.session_state.quiz_stage >= 3:
+    explanation = (f"At this configuration the equilibrium concentration of {shift['species']} changes by "
+                   f"{shift['slope']:+.4f} per unit of the slider.")
+    if st.session_state.quiz3_answer == shift["direction"]:
+        st.success(f"Stage 3 Correct! {explanation}")
+    else:
+        st.error(f"Stage 3 Incorrect. You answered '{st.session_state.quiz3_answer}', but the correct answer is "
+                 f"'{shift['direction']}'. {explanation}")
+
+debug_sidebar("mcq")
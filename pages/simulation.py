@@ -1,99 +1,22 @@
 import streamlit as st
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.integrate import odeint
 
-st.set_page_config(page_title="Simulation", page_icon="⚗️", layout="wide")
-
-def generic_reaction(concentrations, t, k1, k2, a, b, c, d):
-    A, B, C, D = concentrations
-    r_forward = k1 * (A ** a) * (B ** b)
-    r_reverse = k2 * (C ** c) * (D ** d)
-    r = r_forward - r_reverse
-    return [-a * r, -b * r, c * r, d * r]
+from equilibrium.debug import debug_sidebar
+from equilibrium.metrics import start_trace, timed
+from equilibrium.reactions import SPECIES
 
-def draw_connection(t_value, prev_value, next_value, color):
-    plt.vlines(t_value, prev_value, next_value, colors=color, linestyles='solid', linewidth=2)
-
-def simulate_reaction(a, b, c, d, delta_H,
-                      temp_effects, vol_effects,
-                      A_perturb_list, B_perturb_list, C_perturb_list, D_perturb_list,
-                      phase_changes, show_title,
-                      # Phase display toggles:
-                      A_phase1, A_phase2, A_phase3, A_phase4,
-                      B_phase1, B_phase2, B_phase3, B_phase4,
-                      C_phase1, C_phase2, C_phase3, C_phase4,
-                      D_phase1, D_phase2, D_phase3, D_phase4):
-    # Base rate constants.
-    k1_base = 0.02
-    k2_base = 0.01
-    k1_current = k1_base
-    k2_current = k2_base
-    init_state = [1.0, 1.0, 0.0, 0.0]
-    
-    # There are 4 phases: Base and three subsequent phases.
-    phases = ["Base"] + phase_changes
-    sols = []
-    t_phases = []
-    
-    for i, phase in enumerate(phases):
-        t_phase = np.linspace(i * 200, (i + 1) * 200, 1000)
-        sol = odeint(generic_reaction, init_state, t_phase, args=(k1_current, k2_current, a, b, c, d))
-        sols.append(sol)
-        t_phases.append(t_phase)
-        if i < len(phases) - 1:
-            init_state = sol[-1].copy()
-            current_boundary = phase_changes[i]
-            if current_boundary == "Temperature":
-                effect = temp_effects[i]
-                if delta_H < 0:
-                    k2_current = k2_base * (1 + effect)
-                else:
-                    k1_current = k1_base * (1 + effect)
-            elif current_boundary == "Volume/Pressure":
-                effect = vol_effects[i]
-                init_state = init_state / (1 + effect)
-            elif current_boundary == "Addition":
-                init_state[0] *= (1 + A_perturb_list[i])
-                init_state[1] *= (1 + B_perturb_list[i])
-                init_state[2] *= (1 + C_perturb_list[i])
-                init_state[3] *= (1 + D_perturb_list[i])
-    
-    fig = plt.figure(figsize=(10, 6))
-    phases_labels = ["Phase 1", "Phase 2", "Phase 3", "Phase 4"]
-    
-    for i, sol in enumerate(sols):
-        if a != 0 and ((i == 0 and A_phase1) or (i == 1 and A_phase2) or (i == 2 and A_phase3) or (i == 3 and A_phase4)):
-            plt.plot(t_phases[i], sol[:, 0], label=f'A {phases_labels[i]}', color='blue', linewidth=2)
-        if b != 0 and ((i == 0 and B_phase1) or (i == 1 and B_phase2) or (i == 2 and B_phase3) or (i == 3 and B_phase4)):
-            plt.plot(t_phases[i], sol[:, 1], label=f'B {phases_labels[i]}', color='red', linewidth=2)
-        if c != 0 and ((i == 0 and C_phase1) or (i == 1 and C_phase2) or (i == 2 and C_phase3) or (i == 3 and C_phase4)):
-            plt.plot(t_phases[i], sol[:, 2], label=f'C {phases_labels[i]}', color='green', linewidth=2)
-        if d != 0 and ((i == 0 and D_phase1) or (i == 1 and D_phase2) or (i == 2 and D_phase3) or (i == 3 and D_phase4)):
-            plt.plot(t_phases[i], sol[:, 3], label=f'D {phases_labels[i]}', color='purple', linewidth=2)
-    
-    for i in range(len(phases)-1):
-        t_boundary = t_phases[i][-1]
-        if a != 0 and ((i == 0 and A_phase1 and A_phase2) or (i == 1 and A_phase2 and A_phase3) or (i == 2 and A_phase3 and A_phase4)):
-            draw_connection(t_boundary, sols[i][-1, 0], sols[i+1][0, 0], 'blue')
-        if b != 0 and ((i == 0 and B_phase1 and B_phase2) or (i == 1 and B_phase2 and B_phase3) or (i == 2 and B_phase3 and B_phase4)):
-            draw_connection(t_boundary, sols[i][-1, 1], sols[i+1][0, 1], 'red')
-        if c != 0 and ((i == 0 and C_phase1 and C_phase2) or (i == 1 and C_phase2 and C_phase3) or (i == 2 and C_phase3 and C_phase4)):
-            draw_connection(t_boundary, sols[i][-1, 2], sols[i+1][0, 2], 'green')
-        if d != 0 and ((i == 0 and D_phase1 and D_phase2) or (i == 1 and D_phase2 and D_phase3) or (i == 2 and D_phase3 and D_phase4)):
-            draw_connection(t_boundary, sols[i][-1, 3], sols[i+1][0, 3], 'purple')
-    
-    plt.xlabel("Time")
-    plt.ylabel("Concentration")
-    if show_title:
-        title_str = "{}  |  ΔH = {} kJ/mol".format(st.session_state.get('reaction_choice', 'Unknown Reaction'), delta_H)
-        plt.title(title_str)
-    plt.tight_layout()
-    return fig
+st.set_page_config(page_title="Simulation", page_icon="⚗️", layout="wide")
+start_trace()
 
 if "config" not in st.session_state:
     st.error("No reaction configuration found. Please go to the Reaction Setup page and save a configuration.")
 else:
+    # numpy, scipy, matplotlib and Altair are only loaded once there is
+    # something to simulate (and are usually preloaded by the warm-up).
+    from equilibrium.charts import trajectory_chart
+    from equilibrium.render import plot_title, render_result
+    from equilibrium.sampling import ADAPTIVE_SAMPLES
+    from equilibrium.workers import PoolBusy, SimulationTimeout, WorkerError, simulate, simulate_stochastic
+
     config = st.session_state["config"]
     reaction_choice = config["reaction_choice"]
     selected_reaction = config["selected_reaction"]
@@ -112,33 +35,128 @@ else:
 
     st.write("Reaction Selected:", reaction_choice)
     
-    st.sidebar.header("Show/Hide Phase Sections")
-    A_phase1 = st.sidebar.checkbox("A Phase 1", value=True)
-    A_phase2 = st.sidebar.checkbox("A Phase 2", value=True)
-    A_phase3 = st.sidebar.checkbox("A Phase 3", value=True)
-    A_phase4 = st.sidebar.checkbox("A Phase 4", value=True)
-    B_phase1 = st.sidebar.checkbox("B Phase 1", value=True)
-    B_phase2 = st.sidebar.checkbox("B Phase 2", value=True)
-    B_phase3 = st.sidebar.checkbox("B Phase 3", value=True)
-    B_phase4 = st.sidebar.checkbox("B Phase 4", value=True)
-    C_phase1 = st.sidebar.checkbox("C Phase 1", value=True)
-    C_phase2 = st.sidebar.checkbox("C Phase 2", value=True)
-    C_phase3 = st.sidebar.checkbox("C Phase 3", value=True)
-    C_phase4 = st.sidebar.checkbox("C Phase 4", value=True)
-    D_phase1 = st.sidebar.checkbox("D Phase 1", value=True)
-    D_phase2 = st.sidebar.checkbox("D Phase 2", value=True)
-    D_phase3 = st.sidebar.checkbox("D Phase 3", value=True)
-    D_phase4 = st.sidebar.checkbox("D Phase 4", value=True)
+    chart_mode = st.sidebar.radio(
+        "Chart Mode", ["Interactive", "Static Image"],
+        help="Interactive charts show and hide lines in the browser by clicking the legend.",
+    )
     show_title = st.sidebar.checkbox("Show Plot Title", value=True)
-    
-    fig = simulate_reaction(
-        a, b, c, d, delta_H,
-        temp_effects, vol_effects,
-        A_perturb_list, B_perturb_list, C_perturb_list, D_perturb_list,
-        phase_changes, show_title,
-        A_phase1, A_phase2, A_phase3, A_phase4,
-        B_phase1, B_phase2, B_phase3, B_phase4,
-        C_phase1, C_phase2, C_phase3, C_phase4,
-        D_phase1, D_phase2, D_phase3, D_phase4
+    title_str = None
+    if show_title:
+        title_str = plot_title(st.session_state.get('reaction_choice', 'Unknown Reaction'), delta_H)
+
+    model = st.sidebar.radio(
+        "Model", ["Deterministic", "Stochastic"],
+        help="Stochastic follows individual molecules, showing the noise of a small system at equilibrium.",
     )
-    st.pyplot(fig)
+    try:
+        if model == "Stochastic":
+            from equilibrium.stochastic import (
+                BANDS, DEFAULT_ENSEMBLE, DEFAULT_OMEGA, MAX_ENSEMBLE, METHOD_NAMES, OMEGA_CHOICES,
+            )
+
+            omega = st.sidebar.select_slider("Molecules per unit concentration", OMEGA_CHOICES,
+                                             value=DEFAULT_OMEGA, help="Fewer molecules mean larger fluctuations.")
+            ensemble = st.sidebar.slider("Trajectories", 50, MAX_ENSEMBLE, DEFAULT_ENSEMBLE, step=50)
+            seed = st.sidebar.number_input("Random seed", min_value=0, value=0, step=1)
+            # The ensemble loops hold the GIL too, so they run in the worker pool.
+            with timed("simulate_stochastic"):
+                result = simulate_stochastic(config, omega=omega, ensemble=ensemble, seed=int(seed))
+            methods = sorted({METHOD_NAMES[phase["backend"]] for phase in result.stats})
+            st.caption(
+                f"Mean of {ensemble} trajectories with the "
+                + " and ".join(f"{low}–{high}th" for low, high in BANDS)
+                + f" percentile bands ({' and '.join(methods)})."
+            )
+        else:
+            # The trajectories only depend on the saved config, so reruns (and the
+            # MCQ page for the same config) hit the shared cache.
+            with timed("simulate"):
+                result = simulate(config, samples=ADAPTIVE_SAMPLES, sampling="adaptive")
+    except (PoolBusy, SimulationTimeout) as error:
+        st.warning(f"{error} Please reload the page in a moment.")
+        st.stop()
+    except WorkerError as error:
+        # The worker sends its whole traceback; its last line names the error.
+        st.error(f"The simulation failed: {str(error).strip().splitlines()[-1]}")
+        st.stop()
+
+    if chart_mode == "Interactive":
+        # The data goes to the browser once; the legend toggles lines client-side.
+        with timed("chart"):
+            chart = trajectory_chart(result, (a, b, c, d), title_str)
+        with timed("st_altair_chart"):
+            st.altair_chart(chart, width="stretch")
+    else:
+        st.sidebar.header("Show/Hide Phase Sections")
+        n_phases = len(phase_changes) + 1
+        phase_toggles = {
+            species: [st.sidebar.checkbox(f"{species} Phase {i + 1}", value=True) for i in range(n_phases)]
+            for species in SPECIES
+        }
+
+        # Rendered images are cached too, so toggle combinations seen before are free.
+        visibility = tuple(
+            tuple(order != 0 and shown for shown in phase_toggles[species])
+            for species, order in zip(SPECIES, (a, b, c, d))
+        )
+        with timed("render_result"):
+            image = render_result(result, visibility, title_str)
+        with timed("st_image"):
+            st.image(image, width="stretch")
+
+    with st.expander("Animation"):
+        from equilibrium.animate import ANIMATION_FORMATS, available_formats, render_animation
+
+        formats = available_formats()
+        animation_fmt = st.radio("Animation format", formats, format_func=str.upper, horizontal=True,
+                                 help=None if len(formats) == len(ANIMATION_FORMATS)
+                                 else "MP4 and WebM need ffmpeg on the server.")
+        # Encoded clips are cached per config, so only the first view waits.
+        if st.toggle("Animate the graph building up", help="Plays the phases in order and flashes each boundary."):
+            with st.spinner("Rendering animation..."), timed("animation"):
+                clip = render_animation(result, config, animation_fmt, title_str)
+            if animation_fmt == "gif":
+                st.image(clip, width="stretch")
+            else:
+                st.video(clip, format=ANIMATION_FORMATS[animation_fmt]["mime"], loop=True, autoplay=True, muted=True)
+            st.download_button("Download animation", clip, file_name=f"animation.{animation_fmt}",
+                               mime=ANIMATION_FORMATS[animation_fmt]["mime"])
+
+    with st.expander("Export data"):
+        from equilibrium.export import FORMATS, LAYOUTS, export_name, iter_result, iter_zip
+        from equilibrium.generate import parse_configs
+
+        fmt = st.selectbox("Format", list(FORMATS), format_func=str.upper)
+        layout = st.radio("Layout", LAYOUTS, horizontal=True,
+                          help="Long: one row per sample with a phase column. "
+                               "Wide: time and species columns for every phase.")
+        float32 = st.checkbox("Single precision (float32)", help="Halves the file size.")
+        # The exports are built only when a button is clicked. The single
+        # export is the simulation on display: the deterministic run on the
+        # page's grid, or the stochastic ensemble mean.
+        if model == "Stochastic":
+            label = f"Download this simulation (mean of {ensemble} trajectories)"
+            file_name = export_name(config, fmt).replace(".", "_stochastic.", 1)
+        else:
+            label = "Download this simulation"
+            file_name = export_name(config, fmt)
+        st.download_button(label, lambda: b"".join(iter_result(result, config, fmt, layout, float32)),
+                           file_name=file_name, mime=FORMATS[fmt]["mime"])
+
+        uploaded = st.file_uploader("Bulk export: a JSON or YAML list of saved configs",
+                                    type=["json", "yaml", "yml"])
+        st.caption("The ZIP is held in server memory while it downloads. For a whole class, run "
+                   "`python -m equilibrium.export`, which writes it straight to disk.")
+        if uploaded is not None:
+            try:
+                configs = parse_configs(uploaded.getvalue().decode("utf-8"), uploaded.name)
+            except (ImportError, ValueError, KeyError, TypeError) as error:
+                st.error(f"Could not read {uploaded.name}: {error}")
+            else:
+                st.download_button(
+                    f"Download {len(configs)} configs as ZIP (graphs and {fmt.upper()} data)",
+                    lambda: b"".join(iter_zip(configs, fmt, layout, float32)),
+                    file_name=f"{uploaded.name.rsplit('.', 1)[0]}.zip", mime="application/zip",
+                )
+
+debug_sidebar("simulation")
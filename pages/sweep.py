@@ -0,0 +1,84 @@
+import streamlit as st
+
+from equilibrium.debug import debug_sidebar
+from equilibrium.metrics import start_trace, timed
+from equilibrium.reactions import SPECIES
+
+st.set_page_config(page_title="Parameter Sweep", page_icon="⚗️", layout="wide")
+start_trace()
+
+st.title("Parameter Sweep")
+st.markdown(
+    "See how the equilibrium concentrations depend on the size of one or two boundary changes. "
+    "Every grid point is your saved configuration with the chosen slider(s) set to that value, "
+    "and each phase is allowed to reach equilibrium."
+)
+
+if "config" not in st.session_state:
+    st.error("No reaction configuration found. Please go to the Reaction Setup page and save a configuration.")
+else:
+    import numpy as np
+
+    from equilibrium.charts import sweep_chart
+    from equilibrium.sensitivity import sensitivity_parameters
+    from equilibrium.sweep import (
+        DEFAULT_RESOLUTION, MAX_RESOLUTION, compatible, iter_sweep, parameter_label, sweep_axis,
+        sweep_parameters,
+    )
+
+    config = st.session_state["config"]
+    selected_reaction = config["selected_reaction"]
+    st.write("Reaction Selected:", config["reaction_choice"])
+
+    parameters = sweep_parameters(config)
+    st.sidebar.header("Sweep Settings")
+    x_parameter = st.sidebar.selectbox("Parameter 1", parameters, format_func=parameter_label)
+    y_options = [None] + [p for p in parameters if compatible(x_parameter, p)]
+    y_parameter = st.sidebar.selectbox(
+        "Parameter 2 (optional)", y_options,
+        format_func=lambda p: "None" if p is None else parameter_label(p),
+    )
+    resolution = st.sidebar.slider("Grid points per parameter", 5, MAX_RESOLUTION, DEFAULT_RESOLUTION)
+    present = [species for species, key in zip(SPECIES, "abcd") if selected_reaction[key] != 0]
+    species = st.sidebar.selectbox("Species", present)
+    n_phases = len(config["phase_changes"]) + 1
+    phase = st.sidebar.selectbox("Phase", list(range(n_phases)), index=n_phases - 1,
+                                 format_func=lambda i: f"Phase {i + 1}")
+
+    swept = [x_parameter] if y_parameter is None else [x_parameter, y_parameter]
+    axes = [sweep_axis(parameter, resolution) for parameter in swept]
+    titles = [parameter_label(parameter) for parameter in swept]
+    value_title = f"[{species}] at equilibrium, Phase {phase + 1}"
+    column = SPECIES.index(species)
+
+    # Redraw the chart about ten times while the grid fills in.
+    shape = tuple(len(values) for values in axes)
+    n_cells = int(np.prod(shape))
+    values = np.full(n_cells, np.nan)
+    placeholder = st.empty()
+    progress = st.progress(0.0, text="Solving...")
+    done = 0
+    with timed("sweep"):
+        for indices, ends in iter_sweep(config, swept, axes, chunk_size=max(n_cells // 10, 100)):
+            values[indices] = ends[:, phase, column]
+            done += len(indices)
+            placeholder.altair_chart(sweep_chart(axes, values.reshape(shape), titles, value_title),
+                                     width="stretch")
+            progress.progress(done / n_cells, text=f"Solved {done} of {n_cells} grid points")
+    progress.empty()
+
+    if y_parameter is None and x_parameter in sensitivity_parameters(config):
+        # The local slope at the saved value comes from one sensitivity solve
+        # in the worker pool; the caption is left out if the pool cannot take it.
+        from equilibrium.workers import PoolBusy, SimulationTimeout, WorkerError, simulate_sensitivities
+
+        field, boundary = x_parameter
+        try:
+            slope = simulate_sensitivities(config).gradient(phase, x_parameter)[column]
+        except (PoolBusy, SimulationTimeout, WorkerError):
+            slope = None
+        if slope is not None:
+            st.caption(f"At your saved value ({config[field][boundary]:+.2f}) {value_title} changes by "
+                       f"{slope:+.4f} per unit of {parameter_label(x_parameter).split(': ')[1].lower()}.")
+
+debug_sidebar("sweep")
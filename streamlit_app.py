@@ -1,6 +1,12 @@
 import streamlit as st
 
+from equilibrium.reactions import CHANGE_TYPES, DEFAULT_BOUNDARIES, MAX_BOUNDARIES, reaction_options
+from equilibrium.warmup import start_precompute, start_warm_up
+
 st.set_page_config(page_title="Reaction Setup", page_icon="⚗️", layout="wide")
+# Load the simulation stack and precompute the presets in the background while
+# students fill in this page (once per server process).
+start_warm_up()
 
 st.title("Reaction Setup")
 st.markdown(
@@ -8,23 +14,15 @@ st.markdown(
     "Your configuration will be saved and used on the Simulation page."
 )
 
-# Define a dictionary of example reactions with approximate ΔH values.
-reaction_options = {
-    "Haber Process (N₂ + 3H₂ ↔ 2NH₃)": {"a": 1, "b": 3, "c": 2, "d": 0, "delta_H": -92},
-    "Contact Reaction (2SO₂ + O₂ ↔ 2SO₃)": {"a": 2, "b": 1, "c": 2, "d": 0, "delta_H": -197},
-    "Ethanol Production (C₆H₁₂O₆ ↔ 2C₂H₅OH + 2CO₂)": {"a": 1, "b": 0, "c": 2, "d": 2, "delta_H": -218},
-    "Calcium Carbonate Decomposition (CaCO₃ ↔ CaO + CO₂)": {"a": 1, "b": 0, "c": 1, "d": 1, "delta_H": +178},
-    "Dissolution of Ammonium Chloride (NH₄Cl ↔ NH₄⁺ + Cl⁻)": {"a": 1, "b": 0, "c": 1, "d": 1, "delta_H": +15},
-    "Dissolution of Ammonium Nitrate (NH₄NO₃ ↔ NH₄⁺ + NO₃⁻)": {"a": 1, "b": 0, "c": 1, "d": 1, "delta_H": +25},
-}
-
 # -------------------------------
 # Initialize session state defaults for widget keys
 # -------------------------------
 if "reaction_choice" not in st.session_state:
     st.session_state["reaction_choice"] = list(reaction_options.keys())[0]
+if "n_boundaries" not in st.session_state:
+    st.session_state["n_boundaries"] = DEFAULT_BOUNDARIES
 
-for i in range(1, 4):
+for i in range(1, MAX_BOUNDARIES + 1):
     if f"phase_change_{i}" not in st.session_state:
         st.session_state[f"phase_change_{i}"] = "Temperature"
     if f"temp_effect{i}" not in st.session_state:
@@ -52,19 +50,18 @@ reaction_choice = st.selectbox(
 selected_reaction = reaction_options[reaction_choice]
 
 st.subheader("Phase Boundary Changes")
+n_boundaries = st.number_input(
+    "Number of Boundaries",
+    min_value=1, max_value=MAX_BOUNDARIES,
+    step=1,
+    key="n_boundaries"
+)
 
-# Prepare lists to store boundary settings.
+# The change types decide which sliders exist, so they take effect at once.
+st.markdown("Choose what changes at each boundary, then set the sizes of the changes below.")
 phase_changes = []
-temp_effects = []
-vol_effects = []
-A_perturb_list = []
-B_perturb_list = []
-C_perturb_list = []
-D_perturb_list = []
-
-for i in range(1, 4):
-    st.markdown(f"### Boundary {i} Change")
-    change_types = ["Temperature", "Volume/Pressure", "Addition"]
+for i in range(1, n_boundaries + 1):
+    change_types = CHANGE_TYPES
     change_type = st.selectbox(
         f"Select Change Type for Boundary {i}",
         change_types,
@@ -72,101 +69,121 @@ for i in range(1, 4):
         key=f"phase_change_{i}"
     )
     phase_changes.append(change_type)
-    
-    if change_type == "Temperature":
-        effect = st.slider(
-            f"Temperature Effect for Boundary {i}",
-            min_value=-1.0, max_value=1.0,
-            value=st.session_state[f"temp_effect{i}"],
-            step=0.05,
-            key=f"temp_effect_{i}"
-        )
-        temp_effects.append(effect)
-        vol_effects.append(0.0)
-        A_perturb_list.append(0.0)
-        B_perturb_list.append(0.0)
-        C_perturb_list.append(0.0)
-        D_perturb_list.append(0.0)
-    elif change_type == "Volume/Pressure":
-        effect = st.slider(
-            f"Volume/Pressure Effect for Boundary {i}",
-            min_value=-0.5, max_value=0.5,
-            value=st.session_state[f"vol_effect{i}"],
-            step=0.05,
-            key=f"vol_effect_{i}"
-        )
-        vol_effects.append(effect)
-        temp_effects.append(0.0)
-        A_perturb_list.append(0.0)
-        B_perturb_list.append(0.0)
-        C_perturb_list.append(0.0)
-        D_perturb_list.append(0.0)
-    elif change_type == "Addition":
-        st.markdown(f"**Agent Addition for Boundary {i}:**")
-        if selected_reaction['a'] != 0:
-            A_eff = st.slider(
-                f"A Perturb for Boundary {i}",
-                min_value=-0.5, max_value=0.5,
-                value=st.session_state[f"A_perturb{i}"],
-                step=0.05,
-                key=f"A_perturb_{i}"
-            )
-        else:
-            A_eff = 0.0
-        if selected_reaction['b'] != 0:
-            B_eff = st.slider(
-                f"B Perturb for Boundary {i}",
-                min_value=-0.5, max_value=0.5,
-                value=st.session_state[f"B_perturb{i}"],
-                step=0.05,
-                key=f"B_perturb_{i}"
-            )
-        else:
-            B_eff = 0.0
-        if selected_reaction['c'] != 0:
-            C_eff = st.slider(
-                f"C Perturb for Boundary {i}",
-                min_value=-0.5, max_value=0.5,
-                value=st.session_state[f"C_perturb{i}"],
+
+# Prepare lists to store boundary settings.
+temp_effects = []
+vol_effects = []
+A_perturb_list = []
+B_perturb_list = []
+C_perturb_list = []
+D_perturb_list = []
+
+# The sliders sit in a form, so dragging them does not rerun the script; all
+# edits are sent in one rerun when the configuration is saved.
+with st.form("boundary_sliders", border=False):
+    for i, change_type in enumerate(phase_changes, start=1):
+        st.markdown(f"### Boundary {i} Change")
+        if change_type == "Temperature":
+            effect = st.slider(
+                f"Temperature Effect for Boundary {i}",
+                min_value=-1.0, max_value=1.0,
+                value=st.session_state[f"temp_effect{i}"],
                 step=0.05,
-                key=f"C_perturb_{i}"
+                key=f"temp_effect_{i}"
             )
-        else:
-            C_eff = 0.0
-        if selected_reaction['d'] != 0:
-            D_eff = st.slider(
-                f"D Perturb for Boundary {i}",
+            temp_effects.append(effect)
+            vol_effects.append(0.0)
+            A_perturb_list.append(0.0)
+            B_perturb_list.append(0.0)
+            C_perturb_list.append(0.0)
+            D_perturb_list.append(0.0)
+        elif change_type == "Volume/Pressure":
+            effect = st.slider(
+                f"Volume/Pressure Effect for Boundary {i}",
                 min_value=-0.5, max_value=0.5,
-                value=st.session_state[f"D_perturb{i}"],
+                value=st.session_state[f"vol_effect{i}"],
                 step=0.05,
-                key=f"D_perturb_{i}"
+                key=f"vol_effect_{i}"
             )
-        else:
-            D_eff = 0.0
-        A_perturb_list.append(A_eff)
-        B_perturb_list.append(B_eff)
-        C_perturb_list.append(C_eff)
-        D_perturb_list.append(D_eff)
-        temp_effects.append(0.0)
-        vol_effects.append(0.0)
+            vol_effects.append(effect)
+            temp_effects.append(0.0)
+            A_perturb_list.append(0.0)
+            B_perturb_list.append(0.0)
+            C_perturb_list.append(0.0)
+            D_perturb_list.append(0.0)
+        elif change_type == "Addition":
+            st.markdown(f"**Agent Addition for Boundary {i}:**")
+            if selected_reaction['a'] != 0:
+                A_eff = st.slider(
+                    f"A Perturb for Boundary {i}",
+                    min_value=-0.5, max_value=0.5,
+                    value=st.session_state[f"A_perturb{i}"],
+                    step=0.05,
+                    key=f"A_perturb_{i}"
+                )
+            else:
+                A_eff = 0.0
+            if selected_reaction['b'] != 0:
+                B_eff = st.slider(
+                    f"B Perturb for Boundary {i}",
+                    min_value=-0.5, max_value=0.5,
+                    value=st.session_state[f"B_perturb{i}"],
+                    step=0.05,
+                    key=f"B_perturb_{i}"
+                )
+            else:
+                B_eff = 0.0
+            if selected_reaction['c'] != 0:
+                C_eff = st.slider(
+                    f"C Perturb for Boundary {i}",
+                    min_value=-0.5, max_value=0.5,
+                    value=st.session_state[f"C_perturb{i}"],
+                    step=0.05,
+                    key=f"C_perturb_{i}"
+                )
+            else:
+                C_eff = 0.0
+            if selected_reaction['d'] != 0:
+                D_eff = st.slider(
+                    f"D Perturb for Boundary {i}",
+                    min_value=-0.5, max_value=0.5,
+                    value=st.session_state[f"D_perturb{i}"],
+                    step=0.05,
+                    key=f"D_perturb_{i}"
+                )
+            else:
+                D_eff = 0.0
+            A_perturb_list.append(A_eff)
+            B_perturb_list.append(B_eff)
+            C_perturb_list.append(C_eff)
+            D_perturb_list.append(D_eff)
+            temp_effects.append(0.0)
+            vol_effects.append(0.0)
 
-# -------------------------------
-# Save Configuration Button
-# -------------------------------
-if st.button("Save Configuration"):
-    config = {
-        "reaction_choice": reaction_choice,
-        "selected_reaction": selected_reaction,
-        "phase_changes": phase_changes,
-        "temp_effects": temp_effects,
-        "vol_effects": vol_effects,
-        "A_perturb_list": A_perturb_list,
-        "B_perturb_list": B_perturb_list,
-        "C_perturb_list": C_perturb_list,
-        "D_perturb_list": D_perturb_list,
-    }
+    # -------------------------------
+    # Save Configuration Button
+    # -------------------------------
+    save = st.form_submit_button("Save Configuration")
+
+config = {
+    "reaction_choice": reaction_choice,
+    "selected_reaction": selected_reaction,
+    "phase_changes": phase_changes,
+    "temp_effects": temp_effects,
+    "vol_effects": vol_effects,
+    "A_perturb_list": A_perturb_list,
+    "B_perturb_list": B_perturb_list,
+    "C_perturb_list": C_perturb_list,
+    "D_perturb_list": D_perturb_list,
+}
+if save:
     st.session_state["config"] = config
     st.success("Configuration saved!")
+    # Simulate this configuration, and the ones a single slider step away, in
+    # the background so the Simulation page (and the next tweak) usually hits
+    # the cache. The form only sends slider values on submit, so save is the
+    # first point where the config is known.
+    start_precompute(config)
 
 # -------------------------------
 # Update Sliders (and Drop-Downs) Button
@@ -175,8 +192,9 @@ if st.button("Update Sliders to Saved Config"):
     if "config" in st.session_state:
         config = st.session_state["config"]
         # Delete widget keys so that we can update them (including drop-down keys)
-        keys_to_reset = ["reaction_choice"]
-        for i in range(1, 4):
+        n_saved = len(config["phase_changes"])
+        keys_to_reset = ["reaction_choice", "n_boundaries"]
+        for i in range(1, MAX_BOUNDARIES + 1):
             keys_to_reset.extend([
                 f"phase_change_{i}", f"temp_effect{i}", f"vol_effect{i}",
                 f"A_perturb{i}", f"B_perturb{i}", f"C_perturb{i}", f"D_perturb{i}"
@@ -186,7 +204,8 @@ if st.button("Update Sliders to Saved Config"):
                 del st.session_state[key]
         # Now update the keys with the saved configuration.
         st.session_state["reaction_choice"] = config["reaction_choice"]
-        for i in range(1, 4):
+        st.session_state["n_boundaries"] = n_saved
+        for i in range(1, n_saved + 1):
             st.session_state[f"phase_change_{i}"] = config["phase_changes"][i-1]
             st.session_state[f"temp_effect{i}"] = config["temp_effects"][i-1]
             st.session_state[f"vol_effect{i}"] = config["vol_effects"][i-1]